@@ -0,0 +1,307 @@
+import asyncio
+import contextvars
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple
+
+import grpc
+
+current_executor: contextvars.ContextVar[Optional[Executor]] = contextvars.ContextVar(
+    "current_executor", default=None
+)
+
+
+async def run_sync(executor: Optional[Executor], func: Callable, *args) -> Any:
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(context.run, func, *args))
+
+
+def get_handler_behavior(handler: grpc.RpcMethodHandler) -> Tuple[Callable, Callable]:
+    if handler.unary_unary:
+        return grpc.unary_unary_rpc_method_handler, handler.unary_unary
+    elif handler.unary_stream:
+        return grpc.unary_stream_rpc_method_handler, handler.unary_stream
+    elif handler.stream_unary:
+        return grpc.stream_unary_rpc_method_handler, handler.stream_unary
+    elif handler.stream_stream:
+        return grpc.stream_stream_rpc_method_handler, handler.stream_stream
+    else:
+        raise RuntimeError("RPC handler implementation does not exist")
+
+
+def replace_handler_behavior(
+    handler: grpc.RpcMethodHandler, behavior: Callable
+) -> grpc.RpcMethodHandler:
+    factory, _ = get_handler_behavior(handler)
+    return factory(
+        behavior,
+        request_deserializer=handler.request_deserializer,
+        response_serializer=handler.response_serializer,
+    )
+
+
+def wrap_context(context: grpc.aio.ServicerContext) -> "ServicerContext":
+    return context if isinstance(context, ServicerContext) else ServicerContext(context)
+
+
+class ServicerContext:
+    def __init__(self, context: grpc.aio.ServicerContext):
+        self._context = context
+        self._done = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._context, name)
+
+    def is_active(self) -> bool:
+        return not self._done
+
+    def add_callback(self, callback: Callable) -> bool:
+        with self._lock:
+            if self._done:
+                return False
+
+            self._callbacks.append(callback)
+            return True
+
+    def finish(self):
+        with self._lock:
+            self._done = True
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            callback()
+
+
+class RequestIterator:
+    END = object()
+
+    def __init__(
+        self,
+        requests: AsyncIterator,
+        loop: asyncio.AbstractEventLoop,
+        buffer_size: int = 16,
+    ):
+        self._requests = requests
+        self._loop = loop
+        self._buffer = deque()
+        self._queue = queue.Queue()
+        self._slots = asyncio.Semaphore(buffer_size)
+        self._lock = threading.Lock()
+        self._task = None
+        self._is_feeding = False
+        self._is_exhausted = False
+        self._is_closed = False
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self) -> Any:
+        if self._buffer:
+            return self._buffer.popleft()
+
+        if self._is_exhausted:
+            raise StopIteration
+
+        # Blocking reads are only fed once a handler asks for them, so streams
+        # consumed through __anext__ never park an executor thread.
+        with self._lock:
+            if not self._is_feeding:
+                self._is_feeding = True
+                self._loop.call_soon_threadsafe(self.start_feeding)
+
+        item = self._queue.get()
+
+        if item is self.END or isinstance(item, Exception):
+            self._queue.put(item)
+
+            if item is self.END:
+                raise StopIteration
+
+            raise item
+
+        self._loop.call_soon_threadsafe(self._slots.release)
+        return item
+
+    def __aiter__(self) -> AsyncIterator:
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._buffer:
+            return self._buffer.popleft()
+
+        if self._is_exhausted:
+            raise StopAsyncIteration
+
+        try:
+            return await self._requests.__anext__()
+        except StopAsyncIteration:
+            self._is_exhausted = True
+            raise
+
+    async def fill(self, max_size: int):
+        size = 0
+
+        while size <= max_size:
+            try:
+                request = await self._requests.__anext__()
+            except StopAsyncIteration:
+                self._is_exhausted = True
+                return
+
+            self._buffer.append(request)
+            size += request.ByteSize()
+
+    def start_feeding(self):
+        if not self._is_closed:
+            self._task = self._loop.create_task(self.feed())
+
+    async def feed(self):
+        try:
+            while True:
+                await self._slots.acquire()
+                self._queue.put(await self._requests.__anext__())
+        except StopAsyncIteration:
+            self._queue.put(self.END)
+        except Exception as e:
+            self._queue.put(e)
+
+    def close(self):
+        self._is_closed = True
+
+        if self._task:
+            self._task.cancel()
+
+        self._queue.put(self.END)
+
+
+def collect(func: Callable, *args) -> list:
+    return list(func(*args))
+
+
+class RequestStream:
+    def __init__(self, requests: Iterable):
+        self.requests = requests
+        self.is_finished = False
+        self._responses = None
+
+    def start(self) -> Iterable:
+        return ()
+
+    def handle(self, request: Any) -> Iterable:
+        raise NotImplementedError
+
+    def end(self) -> Iterable:
+        return ()
+
+    def finish(self):
+        pass
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self) -> Any:
+        if self._responses is None:
+            self._responses = self.iterate()
+
+        return next(self._responses)
+
+    def close(self):
+        if self._responses is not None:
+            self._responses.close()
+
+    def iterate(self) -> Iterator:
+        requests = iter(self.requests)
+
+        try:
+            yield from self.start()
+
+            while not self.is_finished:
+                try:
+                    request = next(requests)
+                except StopIteration:
+                    yield from self.end()
+                    return
+
+                yield from self.handle(request)
+        finally:
+            self.finish()
+
+    def __aiter__(self) -> AsyncIterator:
+        return self.aiterate()
+
+    async def aiterate(self) -> AsyncIterator:
+        # Requests are awaited on the event loop and only the work for each of
+        # them is sent to the executor, so idle clients do not hold a thread.
+        executor = current_executor.get()
+        requests = self.requests
+
+        if hasattr(requests, "__anext__"):
+            read = requests.__anext__
+        else:
+            requests = iter(requests)
+
+            async def read() -> Any:
+                request = await run_sync(executor, next, requests, RequestIterator.END)
+
+                if request is RequestIterator.END:
+                    raise StopAsyncIteration
+
+                return request
+
+        try:
+            for response in await run_sync(executor, collect, self.start):
+                yield response
+
+            while not self.is_finished:
+                try:
+                    request = await read()
+                except StopAsyncIteration:
+                    for response in await run_sync(executor, collect, self.end):
+                        yield response
+
+                    return
+
+                for response in await run_sync(executor, collect, self.handle, request):
+                    yield response
+        finally:
+            await run_sync(executor, self.finish)
+
+
+async def stream_responses(
+    executor: Executor, behavior: Callable, request: Any, context: ServicerContext
+):
+    responses = await run_sync(executor, behavior, request, context)
+
+    # Handlers can return asynchronous iterables for streams that mostly wait,
+    # so they do not hold executor threads while idle.
+    if hasattr(responses, "__aiter__"):
+        responses = responses.__aiter__()
+
+        try:
+            async for response in responses:
+                yield response
+        finally:
+            if aclose := getattr(responses, "aclose", None):
+                await aclose()
+
+        return
+
+    responses = iter(responses)
+
+    try:
+        while True:
+            response = await run_sync(executor, next, responses, None)
+
+            if response is None:
+                return
+
+            yield response
+    finally:
+        if close := getattr(responses, "close", None):
+            await run_sync(executor, close)
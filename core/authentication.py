@@ -1,6 +1,21 @@
-from typing import Callable
+from typing import Callable, NamedTuple, Optional
+
+
+class QueryBudget(NamedTuple):
+    per_call: Optional[int]
+    per_message: Optional[int]
 
 
 def no_auth(func: Callable) -> Callable:
     func.__dict__["no_auth"] = True
     return func
+
+
+def query_budget(
+    per_call: Optional[int] = None, per_message: Optional[int] = None
+) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        func.__dict__["query_budget"] = QueryBudget(per_call, per_message)
+        return func
+
+    return decorator
@@ -0,0 +1,73 @@
+import logging
+import threading
+from time import sleep
+from typing import Callable, Hashable, Set
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class Accumulator:
+    def __init__(
+        self,
+        flush: Callable[[Set[Hashable]], None],
+        interval: float,
+        max_failures: int = 3,
+    ):
+        self.interval = interval
+        self.max_failures = max_failures
+        self._flush = flush
+        self._items = set()
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, item: Hashable):
+        if self.interval <= 0:
+            self._flush({item})
+            return
+
+        with self._lock:
+            self._items.add(item)
+
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        with self._lock:
+            items, self._items = self._items, set()
+
+        if not items:
+            return
+
+        try:
+            self._flush(items)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+
+                if self._failures < self.max_failures:
+                    self._items |= items
+                else:
+                    self._failures = 0
+                    logger.error(
+                        "Dropping %d items after repeated failures", len(items)
+                    )
+
+            raise
+
+        self._failures = 0
+
+    def _run(self):
+        while True:
+            sleep(self.interval)
+            close_old_connections()
+
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush accumulated items")
+            finally:
+                close_old_connections()
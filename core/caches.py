@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict, defaultdict
+from copy import copy
+from time import monotonic
+from typing import Any, Hashable, Optional, Tuple
+
+from django.db.transaction import on_commit
+
+from .pubsub import Hub
+
+
+class PrincipalCache:
+    channel = "principal_cache.invalidate"
+
+    def __init__(self, max_size: int, timeout: float, hub: Optional[Hub] = None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hub = hub
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries = OrderedDict()
+        self._keys_by_user = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: Hashable, connection_id: Hashable) -> Optional[Tuple]:
+        key = (str(user_id), str(connection_id))
+
+        with self._lock:
+            if entry := self._entries.get(key):
+                deadline, principal = entry
+
+                if deadline > monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return tuple(copy(p) for p in principal)
+
+                self._remove(key)
+
+            self.misses += 1
+            return None
+
+    def set(
+        self,
+        user_id: Hashable,
+        connection_id: Hashable,
+        principal: Tuple[Any, ...],
+        version: int,
+    ):
+        if self.max_size <= 0:
+            return
+
+        key = (str(user_id), str(connection_id))
+        principal = tuple(copy(p) for p in principal)
+
+        with self._lock:
+            if version != self.version:
+                return
+
+            self._entries[key] = (monotonic() + self.timeout, principal)
+            self._entries.move_to_end(key)
+            self._keys_by_user[key[0]].add(key)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def listen(self):
+        self.hub.listen(self.channel, self.on_message)
+
+    def invalidate_user(self, user_id: Hashable):
+        self._invalidate(str(user_id))
+        self._broadcast(str(user_id))
+
+    def invalidate_connection(self, user_id: Hashable, connection_id: Hashable):
+        self._invalidate(str(user_id), str(connection_id))
+        self._broadcast(f"{user_id} {connection_id}")
+
+    def on_message(self, channel: str, message: str):
+        self._invalidate(*message.split())
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _invalidate(self, user_id: str, connection_id: Optional[str] = None):
+        with self._lock:
+            self.version += 1
+
+            if connection_id:
+                self._remove((user_id, connection_id))
+            else:
+                for key in list(self._keys_by_user.get(user_id, [])):
+                    self._remove(key)
+
+    def _broadcast(self, message: str):
+        if self.hub:
+            on_commit(lambda: self.hub.publish(self.channel, message))
+
+    def _remove(self, key: Tuple):
+        if self._entries.pop(key, None) is None:
+            return
+
+        user_keys = self._keys_by_user[key[0]]
+        user_keys.discard(key)
+
+        if not user_keys:
+            del self._keys_by_user[key[0]]
@@ -15,33 +15,116 @@ from grpc_interceptor.exceptions import Unauthenticated
 from psutil import cpu_count
 
 from users.models import Connection
-from users.tasks import use_connection
 
 from . import jwt
-from .interceptors import AuthorizationInterceptor, ExceptionInterceptor
-from .services import get_servicer_interfaces
+from .batching import Accumulator
+from .caches import PrincipalCache
+from .hashing import password_hasher
+from .interceptors import (
+    AsyncAuthorizationInterceptor,
+    AsyncExceptionInterceptor,
+    AsyncMetricsInterceptor,
+    AsyncRateLimitInterceptor,
+    AuthorizationInterceptor,
+    ExceptionInterceptor,
+    ExecutorInterceptor,
+    MetricsInterceptor,
+    RateLimitInterceptor,
+)
+from .metrics import Callback, registry
+from .pubsub import hub
+from .ratelimit import rate_limiter
+from .routes import RouteService, get_routes
+from .services import get_service_full_name, get_servicer_interfaces
 
 User = get_user_model()
 
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_SIZE,
+    timeout=settings.PRINCIPAL_CACHE_TIMEOUT,
+    hub=hub,
+)
+
+connection_usage = Accumulator(
+    flush=Connection.objects.mark_used,
+    interval=settings.CONNECTION_USAGE_FLUSH_INTERVAL,
+)
+
+for metric in [
+    Callback(
+        "principal_cache_hits_total",
+        "Token principals served from the cache.",
+        "counter",
+        lambda: principal_cache.hits,
+    ),
+    Callback(
+        "principal_cache_misses_total",
+        "Token principals loaded from the database.",
+        "counter",
+        lambda: principal_cache.misses,
+    ),
+    Callback(
+        "password_hashing_pending",
+        "Password hashing jobs queued or running.",
+        "gauge",
+        lambda: password_hasher.pending,
+    ),
+    Callback(
+        "password_hashing_rejected_total",
+        "Password hashing jobs rejected because the pool was full.",
+        "counter",
+        lambda: password_hasher.rejected,
+    ),
+    Callback(
+        "rate_limit_rejected_total",
+        "Calls rejected by rate limits.",
+        "counter",
+        lambda: rate_limiter.rejected,
+    ),
+]:
+    registry.register(metric)
+
 
 def create_server(debug: bool = settings.DEBUG) -> grpc.Server:
+    principal_cache.listen()
     services = list(all_servicers())
+    routes = get_routes(services)
+    workers = 1 if debug else cpu_count()
+    password_hasher.limit_to(workers)
     server = grpc.server(
-        futures.ThreadPoolExecutor(max_workers=1 if debug else cpu_count()),
+        futures.ThreadPoolExecutor(max_workers=workers),
         interceptors=(
-            ExceptionInterceptor(),
-            AuthorizationInterceptor(services),
+            ExceptionInterceptor(routes),
+            MetricsInterceptor(routes),
+            AuthorizationInterceptor(routes),
+            RateLimitInterceptor(routes, rate_limiter),
         ),
     )
+    server.add_secure_port(settings.GRPC_URL, _make_server_credentials(debug))
+    _add_services_to_server(services, server)
+    server.add_generic_rpc_handlers((RouteService(routes).get_handler(),))
+    return server
 
-    if debug:
-        server_creds = grpc.local_server_credentials()
-    else:
-        ssl = (settings.SSL_PRIVATE_KEY, settings.SSL_CERTIFICATE_CHAIN)
-        server_creds = grpc.ssl_server_credentials([ssl])
 
-    server.add_secure_port(settings.GRPC_URL, server_creds)
+def create_aio_server(debug: bool = settings.DEBUG) -> grpc.aio.Server:
+    principal_cache.listen()
+    services = list(all_servicers())
+    routes = get_routes(services)
+    workers = cpu_count()
+    password_hasher.limit_to(workers)
+    executor = futures.ThreadPoolExecutor(max_workers=workers)
+    server = grpc.aio.server(
+        interceptors=(
+            AsyncExceptionInterceptor(routes),
+            AsyncMetricsInterceptor(routes),
+            AsyncAuthorizationInterceptor(routes, executor),
+            AsyncRateLimitInterceptor(routes, rate_limiter, executor),
+            ExecutorInterceptor(executor, settings.FILE_UPLOAD_MAX_MEMORY_SIZE),
+        ),
+    )
+    server.add_secure_port(settings.GRPC_URL, _make_server_credentials(debug))
     _add_services_to_server(services, server)
+    server.add_generic_rpc_handlers((RouteService(routes).get_handler(),))
     return server
 
 
@@ -70,14 +153,25 @@ def get_token(context: grpc.ServicerContext) -> Optional[str]:
 def get_info_from_token(token: str) -> Tuple[User, Optional[Connection]]:
     try:
         claims = jwt.decode(token)
-        user = User.objects.get(id=claims["user_id"])
+        user_id = claims["user_id"]
+        connection_id = claims.get("connection_id")
+
+        if connection_id and (principal := principal_cache.get(user_id, connection_id)):
+            connection_usage.add(connection_id)
+            return principal
+
+        cache_version = principal_cache.version
+        user = User.objects.get(id=user_id)
         connection = None
 
-        if connection_id := claims.get("connection_id"):
+        if connection_id:
             connection = Connection.objects.get(id=connection_id)
 
             if connection.user_id == user.id:
-                use_connection.delay(connection_id=connection_id)
+                connection_usage.add(connection_id)
+                principal_cache.set(
+                    user_id, connection_id, (user, connection), cache_version
+                )
             else:
                 raise Unauthenticated("user_id_connection_id_mismatch")
         elif timestamp := claims.get("timestamp"):
@@ -116,9 +210,18 @@ def all_servicers() -> Iterator[Type[Any]]:
                 yield entity
 
 
+def _make_server_credentials(debug: bool) -> grpc.ServerCredentials:
+    if debug:
+        return grpc.local_server_credentials()
+    else:
+        ssl = (settings.SSL_PRIVATE_KEY, settings.SSL_CERTIFICATE_CHAIN)
+        return grpc.ssl_server_credentials([ssl])
+
+
 def _add_services_to_server(services: Iterator[Type[Any]], server: grpc.Server):
     for service in services:
         servicers = get_servicer_interfaces(service)
+        instance = service()
 
         for servicer in servicers:
             addition = f"add_{servicer.__name__}_to_server"
@@ -126,4 +229,33 @@ def _add_services_to_server(services: Iterator[Type[Any]], server: grpc.Server):
 
             for name, entity in getmembers(module):
                 if name == addition and callable(entity):
-                    entity(servicer=service(), server=server)
+                    entity(servicer=instance, server=server)
+
+        if handlers := _make_rpc_method_handlers(instance):
+            service_name = get_service_full_name(servicers[0])
+            generic_handler = grpc.method_handlers_generic_handler(
+                service_name, handlers
+            )
+            server.add_generic_rpc_handlers((generic_handler,))
+
+
+def _make_rpc_method_handlers(instance: Any) -> dict:
+    handlers = {}
+
+    for name, member in getmembers(instance):
+        if not (spec := getattr(member, "__dict__", {}).get("rpc_method")):
+            continue
+
+        request_class, response_class, response_streaming = spec
+        factory = (
+            grpc.unary_stream_rpc_method_handler
+            if response_streaming
+            else grpc.unary_unary_rpc_method_handler
+        )
+        handlers[name] = factory(
+            member,
+            request_deserializer=request_class.FromString,
+            response_serializer=response_class.SerializeToString,
+        )
+
+    return handlers
@@ -0,0 +1,93 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.base_user import AbstractBaseUser
+from grpc_interceptor.exceptions import ResourceExhausted
+
+
+class PasswordHasherPool:
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_pending = workers + queue_size
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def make_password(self, password: Optional[str]) -> str:
+        return self._run(hashers.make_password, password)
+
+    def check_password(self, user: AbstractBaseUser, password: str) -> bool:
+        encoded = user.password
+
+        if password is None or not hashers.is_password_usable(encoded):
+            return False
+
+        preferred = hashers.get_hasher()
+
+        try:
+            hasher = hashers.identify_hasher(encoded)
+        except ValueError:
+            return False
+
+        hasher_changed = hasher.algorithm != preferred.algorithm
+        must_update = hasher_changed or preferred.must_update(encoded)
+        is_correct = self._run(hashers.check_password, password, encoded)
+
+        if is_correct and must_update:
+            user.password = self.make_password(password)
+            user.save(update_fields=["password"])
+
+        return is_correct
+
+    def limit_to(self, server_workers: int):
+        # Callers block a server thread until their job is done, so keep at
+        # least one thread free for other calls.
+        self.max_pending = min(
+            self.workers + self.queue_size, max(1, server_workers - 1)
+        )
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor:
+            executor.shutdown()
+
+    def _run(self, func: Callable, *args) -> Any:
+        if self.workers <= 0:
+            return func(*args)
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ResourceExhausted("password_hashing_overloaded")
+
+            self.pending += 1
+
+            if not self._executor:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=django.setup,
+                )
+
+            executor = self._executor
+
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+password_hasher = PasswordHasherPool(
+    workers=settings.PASSWORD_HASHING_WORKERS,
+    queue_size=settings.PASSWORD_HASHING_QUEUE_SIZE,
+)
@@ -1,6 +1,8 @@
-from importlib import import_module
-from inspect import getmembers
-from typing import Any, Callable, List, Type
+import asyncio
+import logging
+from concurrent.futures import Executor
+from time import monotonic
+from typing import Any, AsyncIterator, Callable, Iterator, Mapping, Optional, Tuple
 
 import grpc
 from django.core.exceptions import ObjectDoesNotExist, PermissionDenied, ValidationError
@@ -9,18 +11,69 @@ from google.protobuf.message import Message
 from grpc_interceptor.exceptions import GrpcException, Unauthenticated
 from grpc_interceptor.server import ServerInterceptor
 
-from .services import get_servicer_interfaces
+from .aio import (
+    RequestIterator,
+    ServicerContext,
+    current_executor,
+    get_handler_behavior,
+    replace_handler_behavior,
+    run_sync,
+    stream_responses,
+    wrap_context,
+)
+from .metrics import Call, current_call
+from .ratelimit import RateLimiter
+from .routes import Route
 
+logger = logging.getLogger(__name__)
 
-def make_method_name(package_name: str, service_name: str, method_name: str) -> str:
-    return f"/{package_name}.{service_name}/{method_name}"
+HANDLED_EXCEPTIONS = (
+    PermissionDenied,
+    ValidationError,
+    DataError,
+    IntegrityError,
+    ObjectDoesNotExist,
+    GrpcException,
+)
 
 
-def get_scope(full_method_name: str) -> str:
-    return full_method_name.split("/")[:-1]
+def get_exception_status(e: Exception) -> Tuple[grpc.StatusCode, str]:
+    if isinstance(e, PermissionDenied):
+        return grpc.StatusCode.PERMISSION_DENIED, str(e)
+    elif isinstance(e, (ValidationError, DataError, IntegrityError)):
+        return grpc.StatusCode.INVALID_ARGUMENT, str(e)
+    elif isinstance(e, ObjectDoesNotExist):
+        return grpc.StatusCode.NOT_FOUND, str(e)
+    else:
+        return e.status_code, e.details
+
+
+def get_exception_code(e: BaseException) -> grpc.StatusCode:
+    if isinstance(e, HANDLED_EXCEPTIONS):
+        return get_exception_status(e)[0]
+    elif isinstance(e, (GeneratorExit, asyncio.CancelledError)):
+        return grpc.StatusCode.CANCELLED
+    else:
+        return grpc.StatusCode.UNKNOWN
+
+
+def is_authentication_required(routes: Mapping[str, Route], method_name: str) -> bool:
+    route = routes.get(method_name)
+    return not route or not route.no_auth
+
+
+def check_deadline_budget(route: Optional[Route], start: float):
+    if route and route.deadline is not None:
+        if (duration := monotonic() - start) > route.deadline:
+            logger.warning(
+                f"{route.name} took {duration:.3f}s, over its {route.deadline}s budget"
+            )
 
 
 class ExceptionInterceptor(ServerInterceptor):
+    def __init__(self, routes: Mapping[str, Route]):
+        self.routes = routes
+
     def intercept(
         self,
         method: Callable,
@@ -28,41 +81,75 @@ class ExceptionInterceptor(ServerInterceptor):
         context: grpc.ServicerContext,
         method_name: str,
     ) -> Any:
+        start = monotonic()
+
         try:
             return super().intercept(method, request, context, method_name)
-        except PermissionDenied as e:
-            context.set_code(grpc.StatusCode.PERMISSION_DENIED)
-            context.set_details(str(e))
-        except (ValidationError, DataError, IntegrityError) as e:
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details(str(e))
-        except ObjectDoesNotExist as e:
-            context.set_code(grpc.StatusCode.NOT_FOUND)
-            context.set_details(str(e))
-        except GrpcException as e:
-            context.set_code(e.status_code)
-            context.set_details(e.details)
+        except HANDLED_EXCEPTIONS as e:
+            code, details = get_exception_status(e)
+            context.set_code(code)
+            context.set_details(details)
+        finally:
+            check_deadline_budget(self.routes.get(method_name), start)
 
 
-class AuthorizationInterceptor(ServerInterceptor):
-    def __init__(self, services: List[Type[Any]]):
-        self.no_auth_method_names = []
+class MetricsInterceptor(ServerInterceptor):
+    def __init__(self, routes: Mapping[str, Route]):
+        self.routes = routes
 
-        for service in services:
-            for servicer in get_servicer_interfaces(service):
-                service_name = servicer.__name__[: -len("Servicer")]
-                module_name = servicer.__module__.replace("pb2_grpc", "pb2")
-                module = import_module(module_name)
-                package_name = module.DESCRIPTOR.package
+    def intercept(
+        self,
+        method: Callable,
+        request: Message,
+        context: grpc.ServicerContext,
+        method_name: str,
+    ) -> Any:
+        if not (route := self.routes.get(method_name)):
+            return super().intercept(method, request, context, method_name)
 
-                for member_name in [
-                    name for name, _ in getmembers(servicer) if hasattr(service, name)
-                ]:
-                    member = getattr(service, member_name)
+        call = route.metrics.start(route.query_budget)
+        token = current_call.set(call)
 
-                    if "no_auth" in getattr(member, "__dict__", {}):
-                        name = make_method_name(package_name, service_name, member_name)
-                        self.no_auth_method_names.append(name)
+        try:
+            response = super().intercept(method, request, context, method_name)
+        except BaseException as e:
+            call.finish(get_exception_code(e))
+            raise
+        finally:
+            current_call.reset(token)
+
+        if route.response_streaming:
+            return self.stream(call, response)
+
+        call.finish(grpc.StatusCode.OK)
+        return response
+
+    def stream(self, call: Call, responses: Iterator) -> Iterator:
+        code = grpc.StatusCode.OK
+
+        try:
+            while True:
+                token = current_call.set(call)
+
+                try:
+                    response = next(responses)
+                except StopIteration:
+                    break
+                finally:
+                    current_call.reset(token)
+
+                call.record_message()
+                yield response
+        except BaseException as e:
+            code = get_exception_code(e)
+            raise
+        finally:
+            call.finish(code)
+
+
+class AuthorizationInterceptor(ServerInterceptor):
+    def __init__(self, routes: Mapping[str, Route]):
+        self.routes = routes
 
     def intercept(
         self,
@@ -75,7 +162,317 @@ class AuthorizationInterceptor(ServerInterceptor):
 
         user = get_user(context)
 
-        if not user and method_name not in self.no_auth_method_names:
+        if not user and is_authentication_required(self.routes, method_name):
             raise Unauthenticated("missing_credentials")
 
         return super().intercept(method, request, context, method_name)
+
+
+class RateLimitInterceptor(ServerInterceptor):
+    def __init__(self, routes: Mapping[str, Route], limiter: RateLimiter):
+        self.routes = routes
+        self.limiter = limiter
+
+    def intercept(
+        self,
+        method: Callable,
+        request: Message,
+        context: grpc.ServicerContext,
+        method_name: str,
+    ) -> Any:
+        if (route := self.routes.get(method_name)) and route.rate_limits:
+            self.limiter.check(method_name, route.rate_limits, request, context)
+
+        return super().intercept(method, request, context, method_name)
+
+
+class AsyncServerInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> Any:
+        return await method(request, context)
+
+    async def intercept_stream(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> AsyncIterator:
+        async for response in method(request, context):
+            yield response
+
+    async def intercept_service(
+        self, continuation: Callable, handler_call_details: grpc.HandlerCallDetails
+    ) -> grpc.RpcMethodHandler:
+        handler = await continuation(handler_call_details)
+
+        if not handler:
+            return handler
+
+        _, method = get_handler_behavior(handler)
+        method_name = handler_call_details.method
+
+        if handler.response_streaming:
+
+            async def behavior(request: Any, context: grpc.aio.ServicerContext):
+                context = wrap_context(context)
+
+                async for response in self.intercept_stream(
+                    method, request, context, method_name
+                ):
+                    yield response
+
+        else:
+
+            async def behavior(request: Any, context: grpc.aio.ServicerContext):
+                context = wrap_context(context)
+                return await self.intercept(method, request, context, method_name)
+
+        return replace_handler_behavior(handler, behavior)
+
+
+class AsyncExceptionInterceptor(AsyncServerInterceptor):
+    def __init__(self, routes: Mapping[str, Route]):
+        self.routes = routes
+
+    async def intercept(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> Any:
+        start = monotonic()
+
+        try:
+            return await super().intercept(method, request, context, method_name)
+        except HANDLED_EXCEPTIONS as e:
+            await context.abort(*get_exception_status(e))
+        finally:
+            check_deadline_budget(self.routes.get(method_name), start)
+
+    async def intercept_stream(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> AsyncIterator:
+        try:
+            async for response in super().intercept_stream(
+                method, request, context, method_name
+            ):
+                yield response
+        except HANDLED_EXCEPTIONS as e:
+            await context.abort(*get_exception_status(e))
+
+
+class AsyncMetricsInterceptor(AsyncServerInterceptor):
+    def __init__(self, routes: Mapping[str, Route]):
+        self.routes = routes
+
+    async def intercept(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> Any:
+        if not (route := self.routes.get(method_name)):
+            return await super().intercept(method, request, context, method_name)
+
+        call = route.metrics.start(route.query_budget)
+        token = current_call.set(call)
+        code = grpc.StatusCode.OK
+
+        try:
+            return await super().intercept(method, request, context, method_name)
+        except BaseException as e:
+            code = get_exception_code(e)
+            raise
+        finally:
+            current_call.reset(token)
+            call.finish(code)
+
+    async def intercept_stream(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> AsyncIterator:
+        if not (route := self.routes.get(method_name)):
+            async for response in super().intercept_stream(
+                method, request, context, method_name
+            ):
+                yield response
+
+            return
+
+        call = route.metrics.start(route.query_budget)
+        token = current_call.set(call)
+        code = grpc.StatusCode.OK
+
+        try:
+            async for response in super().intercept_stream(
+                method, request, context, method_name
+            ):
+                call.record_message()
+                yield response
+        except BaseException as e:
+            code = get_exception_code(e)
+            raise
+        finally:
+            current_call.reset(token)
+            call.finish(code)
+
+
+class AsyncAuthorizationInterceptor(AsyncServerInterceptor):
+    def __init__(self, routes: Mapping[str, Route], executor: Executor):
+        self.routes = routes
+        self.executor = executor
+
+    async def intercept(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> Any:
+        await self.authorize(context, method_name)
+        return await super().intercept(method, request, context, method_name)
+
+    async def intercept_stream(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> AsyncIterator:
+        await self.authorize(context, method_name)
+
+        async for response in super().intercept_stream(
+            method, request, context, method_name
+        ):
+            yield response
+
+    async def authorize(self, context: grpc.aio.ServicerContext, method_name: str):
+        from .grpc import get_user
+
+        user = await run_sync(self.executor, get_user, context)
+
+        if not user and is_authentication_required(self.routes, method_name):
+            raise Unauthenticated("missing_credentials")
+
+
+class AsyncRateLimitInterceptor(AsyncServerInterceptor):
+    def __init__(
+        self, routes: Mapping[str, Route], limiter: RateLimiter, executor: Executor
+    ):
+        self.routes = routes
+        self.limiter = limiter
+        self.executor = executor
+
+    async def intercept(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> Any:
+        await self.check(request, context, method_name)
+        return await super().intercept(method, request, context, method_name)
+
+    async def intercept_stream(
+        self,
+        method: Callable,
+        request: Any,
+        context: grpc.aio.ServicerContext,
+        method_name: str,
+    ) -> AsyncIterator:
+        await self.check(request, context, method_name)
+
+        async for response in super().intercept_stream(
+            method, request, context, method_name
+        ):
+            yield response
+
+    async def check(
+        self, request: Any, context: grpc.aio.ServicerContext, method_name: str
+    ):
+        if (route := self.routes.get(method_name)) and route.rate_limits:
+            await run_sync(
+                self.executor,
+                self.limiter.check,
+                method_name,
+                route.rate_limits,
+                request,
+                context,
+            )
+
+
+class ExecutorInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, executor: Executor, max_buffer_size: int = 0):
+        self.executor = executor
+        self.max_buffer_size = max_buffer_size
+
+    async def intercept_service(
+        self, continuation: Callable, handler_call_details: grpc.HandlerCallDetails
+    ) -> grpc.RpcMethodHandler:
+        handler = await continuation(handler_call_details)
+
+        if not handler:
+            return handler
+
+        _, method = get_handler_behavior(handler)
+        executor = self.executor
+        max_buffer_size = self.max_buffer_size
+
+        def prepare(request: Any, context: grpc.aio.ServicerContext) -> Tuple:
+            if handler.request_streaming:
+                request = RequestIterator(request, asyncio.get_running_loop())
+
+            return request, wrap_context(context)
+
+        def finish(request: Any, context: ServicerContext):
+            if isinstance(request, RequestIterator):
+                request.close()
+
+            context.finish()
+
+        if handler.response_streaming:
+
+            async def behavior(request: Any, context: grpc.aio.ServicerContext):
+                request, context = prepare(request, context)
+                token = current_executor.set(executor)
+
+                try:
+                    async for response in stream_responses(
+                        executor, method, request, context
+                    ):
+                        yield response
+                finally:
+                    current_executor.reset(token)
+                    finish(request, context)
+
+        else:
+
+            async def behavior(request: Any, context: grpc.aio.ServicerContext):
+                request, context = prepare(request, context)
+
+                try:
+                    # Uploads are read ahead on the event loop, so handlers only
+                    # block on streams larger than the buffer.
+                    if isinstance(request, RequestIterator):
+                        await request.fill(max_buffer_size)
+
+                    return await run_sync(executor, method, request, context)
+                finally:
+                    finish(request, context)
+
+        return replace_handler_behavior(handler, behavior)
@@ -0,0 +1,34 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from core.storages import FileSystemStorage
+
+
+class Command(BaseCommand):
+    def handle(self, *args, **kwargs):
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField) and isinstance(
+                    field.storage, FileSystemStorage
+                ):
+                    self.migrate_field(model, field)
+
+    def migrate_field(self, model: type, field: models.FileField):
+        storage = field.storage
+        queryset = model._base_manager.exclude(**{field.name: ""}).exclude(
+            **{f"{field.name}__isnull": True}
+        )
+        count = 0
+
+        for pk, name in queryset.values_list("pk", field.name).iterator():
+            if storage.is_sharded(name):
+                continue
+
+            new_name = storage.migrate(name)
+            model._base_manager.filter(pk=pk, **{field.name: name}).update(
+                **{field.name: new_name}
+            )
+            count += 1
+
+        self.stdout.write(f"{model._meta.label}.{field.name}: {count}")
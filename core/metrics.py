@@ -0,0 +1,351 @@
+import logging
+import threading
+from contextvars import ContextVar, Token
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+import grpc
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .authentication import QueryBudget
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+
+def format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+
+    labels = []
+
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", r"\\").replace("\n", r"\n")
+        value = value.replace('"', r"\"")
+        labels.append(f'{name}="{value}"')
+
+    return "{" + ",".join(labels) + "}"
+
+
+class Value:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def collect(self, name: str, labels: str) -> Iterator[str]:
+        yield f"{name}{labels} {self.value}"
+
+
+class HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def collect(self, name: str, labels: str) -> Iterator[str]:
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+
+        prefix = labels[:-1] + "," if labels else "{"
+        cumulative = 0
+
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            yield f'{name}_bucket{prefix}le="{bound}"}} {cumulative}'
+
+        yield f'{name}_bucket{prefix}le="+Inf"}} {count}'
+        yield f"{name}_sum{labels} {total}"
+        yield f"{name}_count{labels} {count}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: Any) -> Any:
+        with self._lock:
+            if not (child := self._children.get(values)):
+                child = self._children[values] = self.make_child()
+
+        return child
+
+    def make_child(self) -> Any:
+        return Value()
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+        with self._lock:
+            children = list(self._children.items())
+
+        for values, child in children:
+            yield from child.collect(self.name, format_labels(self.label_names, values))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets)
+
+    def make_child(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+
+class Callback(Metric):
+    def __init__(self, name: str, description: str, kind: str, get: Callable):
+        super().__init__(name, description)
+        self.kind = kind
+        self.get = get
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {self.get()}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "".join(line + "\n" for m in self.metrics for line in m.collect())
+
+
+registry = Registry()
+
+handled = registry.register(
+    Counter(
+        "grpc_server_handled_total",
+        "RPCs completed on the server, by status code.",
+        ["grpc_method", "grpc_code"],
+    )
+)
+
+handling_seconds = registry.register(
+    Histogram(
+        "grpc_server_handling_seconds",
+        "Time spent handling RPCs on the server.",
+        ["grpc_method"],
+    )
+)
+
+in_flight = registry.register(
+    Gauge(
+        "grpc_server_in_flight",
+        "RPCs currently being handled on the server.",
+        ["grpc_method"],
+    )
+)
+
+messages_sent = registry.register(
+    Counter(
+        "grpc_server_msg_sent_total",
+        "Messages streamed to clients by the server.",
+        ["grpc_method"],
+    )
+)
+
+db_queries = registry.register(
+    Histogram(
+        "grpc_server_db_queries",
+        "SQL queries executed per RPC.",
+        ["grpc_method"],
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
+
+db_seconds = registry.register(
+    Counter(
+        "grpc_server_db_seconds_total",
+        "Time spent executing SQL queries during RPCs.",
+        ["grpc_method"],
+    )
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def check_query_budget(description: str, queries: int, budget: Optional[int]):
+    if budget is None or queries <= budget:
+        return
+
+    message = f"{description} ran {queries} queries, over its budget of {budget}"
+
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+
+    logger.warning(message)
+
+
+class Call:
+    def __init__(self, metrics: "RouteMetrics", budget: Optional[QueryBudget] = None):
+        self.metrics = metrics
+        self.budget = budget
+        self.start = monotonic()
+        self.queries = 0
+        self.query_time = 0
+        self.message_queries = 0
+
+    def record_query(self, duration: float):
+        self.queries += 1
+        self.query_time += duration
+
+    def record_message(self):
+        self.metrics.messages_sent.inc()
+        queries = self.queries - self.message_queries
+        self.message_queries = self.queries
+
+        if self.budget:
+            description = f"A message of {self.metrics.method_name}"
+            check_query_budget(description, queries, self.budget.per_message)
+
+    def finish(self, code: grpc.StatusCode):
+        self.metrics.handling_seconds.observe(monotonic() - self.start)
+        self.metrics.in_flight.dec()
+        self.metrics.get_handled(code).inc()
+        self.metrics.db_queries.observe(self.queries)
+        self.metrics.db_seconds.inc(self.query_time)
+
+        if self.budget and code == grpc.StatusCode.OK:
+            description = self.metrics.method_name
+            check_query_budget(description, self.queries, self.budget.per_call)
+
+
+class RouteMetrics:
+    def __init__(self, method_name: str):
+        self.method_name = method_name
+        self.handling_seconds = handling_seconds.labels(method_name)
+        self.in_flight = in_flight.labels(method_name)
+        self.messages_sent = messages_sent.labels(method_name)
+        self.db_queries = db_queries.labels(method_name)
+        self.db_seconds = db_seconds.labels(method_name)
+        self._handled: Dict[grpc.StatusCode, Value] = {}
+
+    def get_handled(self, code: grpc.StatusCode) -> Value:
+        if not (value := self._handled.get(code)):
+            value = self._handled[code] = handled.labels(self.method_name, code.name)
+
+        return value
+
+    def start(self, budget: Optional[QueryBudget] = None) -> Call:
+        self.in_flight.inc()
+        return Call(self, budget)
+
+
+current_call: ContextVar[Optional[Call]] = ContextVar("current_call", default=None)
+
+
+def record_query(
+    execute: Callable, sql: str, params: Any, many: bool, context: Dict
+) -> Any:
+    if not (call := current_call.get()):
+        return execute(sql, params, many, context)
+
+    start = monotonic()
+
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        call.record_query(monotonic() - start)
+
+
+@receiver(connection_created)
+def on_connection_created(connection: BaseDatabaseWrapper, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Eager tasks run inside the call that queued them, but their queries belong to
+# the task, as they would on a worker.
+task_tokens: Dict[str, Token] = {}
+
+
+@task_prerun.connect
+def on_task_prerun(task_id: str, **kwargs):
+    task_tokens[task_id] = current_call.set(None)
+
+
+@task_postrun.connect
+def on_task_postrun(task_id: str, **kwargs):
+    if token := task_tokens.pop(task_id, None):
+        current_call.reset(token)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Tuple):
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("", port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,67 +1,140 @@
 import uuid
 from datetime import datetime
+from functools import reduce
 from importlib import import_module
-from typing import Any, Dict, List, Optional, Tuple, Type
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Tuple, Type
 
 from django.db import models
 from django.db.models.fields.files import ImageFieldFile
+from django.db.transaction import atomic
 from google.protobuf import empty_pb2, timestamp_pb2
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
 from google.protobuf.message import Message
 
 from core.storages import get_image_url
 from protos import image_pb2
 
-from .signals import post_soft_delete, pre_soft_delete
+from .signals import post_bulk_soft_delete, post_soft_delete, pre_soft_delete
+
+_message_converters = {}
+_missing = object()
+
+
+def get_message_class(descriptor: Descriptor) -> Type[Message]:
+    module_name = descriptor.file.name.replace(".proto", "_pb2").replace("/", ".")
+    names = descriptor.full_name.removeprefix(descriptor.file.package + ".")
+    return reduce(getattr, names.split("."), import_module(module_name))
+
+
+def get_message_converter(
+    message_class: Type[Message], overrides: Iterable[str] = ()
+) -> "MessageConverter":
+    key = (message_class, frozenset(overrides))
+
+    if not (converter := _message_converters.get(key)):
+        converter = MessageConverter(message_class, key[1])
+        _message_converters[key] = converter
+
+    return converter
+
+
+def _convert_datetime(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return timestamp_pb2.Timestamp(seconds=round(value.timestamp()))
+    else:
+        return value
+
+
+def _convert_image(value: Any) -> Any:
+    if isinstance(value, ImageFieldFile):
+        return image_pb2.Image(url=get_image_url(value)) if value else None
+    else:
+        return value
+
+
+def _make_message_convertible_converter(message_class: Type[Message]) -> Callable:
+    def convert(value: Any) -> Any:
+        if isinstance(value, MessageConvertible):
+            return value.to_message(message_class=message_class)
+        else:
+            return value
+
+    return convert
+
+
+def _make_value_converter(field: FieldDescriptor) -> Optional[Callable]:
+    if field.type != FieldDescriptor.TYPE_MESSAGE:
+        return None
+    elif field.message_type.full_name == timestamp_pb2.Timestamp.DESCRIPTOR.full_name:
+        return _convert_datetime
+    elif field.message_type.full_name == image_pb2.Image.DESCRIPTOR.full_name:
+        return _convert_image
+    else:
+        message_class = get_message_class(field.message_type)
+        return _make_message_convertible_converter(message_class)
+
+
+class MessageConverter:
+    def __init__(self, message_class: Type[Message], excluded_fields: FrozenSet[str]):
+        self.value_converters = {}
+        self.accessors = []
+
+        for name, field in message_class.DESCRIPTOR.fields_by_name.items():
+            value_converter = _make_value_converter(field)
+            self.value_converters[name] = value_converter
+
+            if name not in excluded_fields:
+                self.accessors.append((name, value_converter))
+
+    def convert(self, instance: Any, fields: Optional[Iterable[str]] = None) -> dict:
+        accessors = (
+            self.accessors
+            if fields is None
+            else [a for a in self.accessors if a[0] in fields]
+        )
+        values = {}
+
+        for name, value_converter in accessors:
+            if (value := getattr(instance, name, _missing)) is _missing:
+                continue
+
+            values[name] = value_converter(value) if value_converter else value
+
+        return values
+
+    def convert_value(self, field: str, value: Any) -> Any:
+        value_converter = self.value_converters[field]
+        return value_converter(value) if value_converter else value
 
 
 class MessageConvertible:
     default_message_class = empty_pb2.Empty
-    _message_class = None
-    _field_message_classes = {}
 
-    def get_message_fields(self, **overrides) -> List[str]:
-        return self._message_class.DESCRIPTOR.fields_by_name.keys()
+    def get_message_fields(
+        self, message_class: Type[Message], **overrides
+    ) -> Optional[Iterable[str]]:
+        return None
 
-    def get_message_field_values(self, **overrides) -> dict:
-        return {
-            field: self.convert_field(field)
-            for field in self.get_message_fields(**overrides)
-            if hasattr(self, field) and field not in overrides
-        }
+    def get_message_field_values(
+        self, message_class: Type[Message], **overrides
+    ) -> dict:
+        converter = get_message_converter(message_class, overrides)
+        fields = self.get_message_fields(message_class, **overrides)
+        return converter.convert(self, fields)
 
     def to_message(
         self, message_class: Optional[Type[Message]] = None, **overrides
     ) -> Message:
-        old_messages_class = self._message_class
-        self._message_class = message_class or self.default_message_class
-        values = self.get_message_field_values(**overrides)
+        message_class = message_class or self.default_message_class
+        values = self.get_message_field_values(message_class, **overrides)
         values.update(overrides)
-        message = self._message_class(**values)
-        self._message_class = old_messages_class
-        return message
-
-    def convert_field(self, field: str) -> Any:
-        return self.convert_value(field, getattr(self, field))
-
-    def convert_value(self, field: str, value: Any) -> Any:
-        if isinstance(value, datetime):
-            return timestamp_pb2.Timestamp(seconds=round(value.timestamp()))
-        elif isinstance(value, MessageConvertible):
-            return value.to_message(message_class=self._retrieve_message_class(field))
-        elif isinstance(value, ImageFieldFile):
-            return image_pb2.Image(url=get_image_url(value)) if value else None
-        else:
-            return value
+        return message_class(**values)
 
-    def _retrieve_message_class(self, field: str) -> Type[Message]:
-        if message_class := self.__class__._field_message_classes.get(field):
-            return message_class
-
-        field_type = getattr(self._message_class, field).DESCRIPTOR.message_type
-        module_name = field_type.file.name.replace(".proto", "_pb2").replace("/", ".")
-        message_class = getattr(import_module(module_name), field_type.name)
-        self.__class__._field_message_classes[field] = message_class
-        return message_class
+    def convert_value(
+        self, message_class: Type[Message], field: str, value: Any
+    ) -> Any:
+        converter = get_message_converter(message_class)
+        return converter.convert_value(field, value)
 
 
 class UUIDModel(models.Model, MessageConvertible):
@@ -70,8 +143,10 @@ class UUIDModel(models.Model, MessageConvertible):
 
     id = models.UUIDField(primary_key=True, unique=True, default=uuid.uuid4)
 
-    def get_message_field_values(self, **overrides) -> dict:
-        data = super().get_message_field_values(**overrides)
+    def get_message_field_values(
+        self, message_class: Type[Message], **overrides
+    ) -> dict:
+        data = super().get_message_field_values(message_class, **overrides)
 
         if data_id := data.get("id"):
             data["id"] = str(data_id)
@@ -90,6 +165,7 @@ class SoftDeleteModel(models.Model, MessageConvertible):
     class Meta:
         abstract = True
 
+    soft_delete_values: Dict[str, Any] = {}
     is_deleted = models.BooleanField(default=False)
 
     def soft_delete(self) -> Tuple[int, Dict[str, int]]:
@@ -99,10 +175,65 @@ class SoftDeleteModel(models.Model, MessageConvertible):
         return 0, {}
 
     def perform_soft_delete(self):
+        for field, value in self.soft_delete_values.items():
+            setattr(self, field, value)
+
         self.is_deleted = True
         self.save()
 
 
+class SoftDeleteQuerySet(models.QuerySet):
+    def soft_delete(self) -> int:
+        pk_set = list(self.filter(is_deleted=False).values_list("pk", flat=True))
+
+        if not pk_set:
+            return 0
+
+        count = self.model._base_manager.filter(pk__in=pk_set).update(
+            is_deleted=True, **self.model.soft_delete_values
+        )
+        post_bulk_soft_delete.send(sender=self.model, pk_set=pk_set)
+        return count
+
+
 class ExistingManager(models.Manager):
     def get_queryset(self) -> models.QuerySet:
         return super().get_queryset().filter(is_deleted=False)
+
+
+class StoredFileManager(models.Manager):
+    @atomic
+    def acquire(self, name: str):
+        if not self.filter(name=name).update(references=models.F("references") + 1):
+            _, created = self.get_or_create(name=name, defaults={"references": 1})
+
+            if not created:
+                self.filter(name=name).update(references=models.F("references") + 1)
+
+    @atomic
+    def release(self, name: str) -> bool:
+        if self.filter(name=name, references__gt=1).update(
+            references=models.F("references") - 1
+        ):
+            return False
+
+        self.filter(name=name).delete()
+        return True
+
+
+class StoredFile(models.Model):
+    objects = StoredFileManager()
+
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.references}"
+
+
+class TrashedFile(models.Model):
+    name = models.CharField(max_length=255)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.name
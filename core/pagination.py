@@ -1,17 +1,92 @@
 import re
+import struct
+import uuid
 from abc import ABC, abstractmethod
-from typing import Callable, Iterable, Iterator, List, Optional, Type
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Type
 
 from django.conf import settings
-from django.db.models import Model, QuerySet
+from django.db.models import BooleanField, F, Func, Model, QuerySet, Value
+from django.db.models.lookups import Exact
 from django.db.models.query_utils import Q
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
 from google.protobuf.message import Message
 from grpc_interceptor.exceptions import InvalidArgument
 
+from core.aio import RequestStream
 from core.models import MessageConvertible
 from protos import pagination_pb2
 
 
+class RowValueExact(Exact):
+    def as_sql(self, compiler, connection) -> Tuple[str, list]:
+        if self.rhs is True:
+            return compiler.compile(self.lhs)
+
+        return super().as_sql(compiler, connection)
+
+
+class RowValueComparison(Func):
+    conditional = True
+    output_field = BooleanField()
+    operators = {"gt": ">", "lt": "<"}
+
+    def __init__(self, fields: List[str], values: List[Any], comparator: str):
+        super().__init__(*(F(f) for f in fields))
+        self.values = values
+        self.operator = self.operators[comparator]
+
+    def get_lookup(self, lookup_name: str) -> Any:
+        if lookup_name == "exact":
+            return RowValueExact
+
+        return super().get_lookup(lookup_name)
+
+    def compile_pairs(self, compiler, connection) -> List[Tuple[str, list, str, list]]:
+        pairs = []
+
+        for expression, value in zip(self.get_source_expressions(), self.values):
+            lhs_sql, lhs_params = compiler.compile(expression)
+            value = Value(value, output_field=expression.output_field)
+            rhs_sql, rhs_params = compiler.compile(value)
+            pairs.append((lhs_sql, lhs_params, rhs_sql, rhs_params))
+
+        return pairs
+
+    def as_sql(self, compiler, connection, **extra_context) -> Tuple[str, list]:
+        pairs = self.compile_pairs(compiler, connection)
+        clauses = []
+        params = []
+
+        for i, (lhs_sql, lhs_params, rhs_sql, rhs_params) in enumerate(pairs):
+            terms = []
+
+            for equal_pair in pairs[:i]:
+                terms.append(f"{equal_pair[0]} = {equal_pair[2]}")
+                params.extend(equal_pair[1] + equal_pair[3])
+
+            terms.append(f"{lhs_sql} {self.operator} {rhs_sql}")
+            params.extend(lhs_params + rhs_params)
+            clauses.append("(" + " AND ".join(terms) + ")")
+
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def as_row_value_sql(self, compiler, connection) -> Tuple[str, list]:
+        pairs = self.compile_pairs(compiler, connection)
+        lhs = ", ".join(p[0] for p in pairs)
+        rhs = ", ".join(p[2] for p in pairs)
+        params = [x for p in pairs for x in p[1]] + [x for p in pairs for x in p[3]]
+        return f"({lhs}) {self.operator} ({rhs})", params
+
+    def as_mysql(self, compiler, connection, **extra_context) -> Tuple[str, list]:
+        return self.as_row_value_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection, **extra_context) -> Tuple[str, list]:
+        return self.as_row_value_sql(compiler, connection)
+
+
 class PaginationAdapter(ABC):
     @abstractmethod
     def get_cursor_fields(self) -> Iterable[str]:
@@ -20,9 +95,15 @@ class PaginationAdapter(ABC):
     def order_queryset(self, query: QuerySet) -> QuerySet:
         return query.order_by(*self.get_cursor_fields())
 
-    def make_queryset_filters(self, page: pagination_pb2.Page) -> Q:
+    def prefetch_queryset(self, query: QuerySet) -> QuerySet:
+        return query
+
+    def make_queryset_filters(
+        self, page: pagination_pb2.Page, values: Iterable[Tuple[str, Any]]
+    ) -> Q:
         filters = Q()
         equalities = {}
+        values = list(values)
 
         if page.forward == page.cursor.is_next:
             comp_normal = "gt"
@@ -31,14 +112,24 @@ class PaginationAdapter(ABC):
             comp_normal = "lt"
             comp_reverse = "gt"
 
-        for pair in page.cursor.data:
-            comparator = comp_reverse if pair.key.startswith("-") else comp_normal
+        if values and len({key.startswith("-") for key, _ in values}) == 1:
+            comparator = comp_reverse if values[0][0].startswith("-") else comp_normal
+            return Q(
+                RowValueComparison(
+                    [key.removeprefix("-") for key, _ in values],
+                    [value for _, value in values],
+                    comparator,
+                )
+            )
+
+        for key, value in values:
+            comparator = comp_reverse if key.startswith("-") else comp_normal
             stuff = {
                 **equalities,
-                pair.key.removeprefix("-") + "__" + comparator: pair.value,
+                key.removeprefix("-") + "__" + comparator: value,
             }
             filters |= Q(**stuff)
-            equalities[pair.key] = pair.value
+            equalities[key.removeprefix("-")] = value
 
         return filters
 
@@ -55,86 +146,242 @@ class PaginationAdapter(ABC):
             raise ValueError
 
 
-class PaginatorMixin:
-    def paginate(
+class CursorCodec(ABC):
+    @abstractmethod
+    def encode(
+        self, adapter: PaginationAdapter, item: Model
+    ) -> List[pagination_pb2.KeyValuePair]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(
+        self, adapter: PaginationAdapter, cursor: pagination_pb2.Cursor
+    ) -> List[Tuple[str, Any]]:
+        raise NotImplementedError
+
+
+class TextCursorCodec(CursorCodec):
+    def encode(
+        self, adapter: PaginationAdapter, item: Model
+    ) -> List[pagination_pb2.KeyValuePair]:
+        return adapter.make_cursor_data(item)
+
+    def decode(
+        self, adapter: PaginationAdapter, cursor: pagination_pb2.Cursor
+    ) -> List[Tuple[str, Any]]:
+        return [(pair.key, pair.value) for pair in cursor.data]
+
+
+class BinaryCursorCodec(CursorCodec):
+    key_salt = "core.pagination.BinaryCursorCodec"
+    signature_size = 16
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    microsecond = timedelta(microseconds=1)
+
+    def encode(
+        self, adapter: PaginationAdapter, item: Model
+    ) -> List[pagination_pb2.KeyValuePair]:
+        data = b"".join(
+            self.pack_value(getattr(item, field.removeprefix("-")))
+            for field in adapter.get_cursor_fields()
+        )
+        value = urlsafe_b64encode(self.sign(data) + data).rstrip(b"=")
+        return [pagination_pb2.KeyValuePair(value=value.decode())]
+
+    def decode(
+        self, adapter: PaginationAdapter, cursor: pagination_pb2.Cursor
+    ) -> List[Tuple[str, Any]]:
+        fields = list(adapter.get_cursor_fields())
+
+        try:
+            (pair,) = cursor.data
+            raw = urlsafe_b64decode(pair.value + "=" * (-len(pair.value) % 4))
+            signature, data = raw[: self.signature_size], raw[self.signature_size :]
+
+            if not constant_time_compare(signature, self.sign(data)):
+                raise ValueError("Invalid cursor signature")
+
+            values = []
+            offset = 0
+
+            while offset < len(data):
+                value, offset = self.unpack_value(data, offset)
+                values.append(value)
+
+            if len(values) != len(fields):
+                raise ValueError("Invalid cursor length")
+        except (ValueError, TypeError, struct.error):
+            raise InvalidArgument("invalid_cursor")
+
+        return list(zip(fields, values))
+
+    def sign(self, data: bytes) -> bytes:
+        return salted_hmac(self.key_salt, data, algorithm="sha256").digest()[
+            : self.signature_size
+        ]
+
+    def pack_value(self, value: Any) -> bytes:
+        if value is None:
+            return b"n"
+        elif isinstance(value, datetime):
+            return b"d" + struct.pack(">q", (value - self.epoch) // self.microsecond)
+        elif isinstance(value, uuid.UUID):
+            return b"u" + value.bytes
+        elif isinstance(value, int):
+            return b"i" + struct.pack(">q", value)
+        else:
+            data = str(value).encode()
+            return b"s" + struct.pack(">H", len(data)) + data
+
+    def unpack_value(self, data: bytes, offset: int) -> Tuple[Any, int]:
+        tag, offset = data[offset : offset + 1], offset + 1
+
+        if tag == b"n":
+            return None, offset
+        elif tag == b"d":
+            (value,) = struct.unpack_from(">q", data, offset)
+            return self.epoch + value * self.microsecond, offset + 8
+        elif tag == b"u":
+            if len(data) < offset + 16:
+                raise ValueError("Truncated cursor")
+
+            return uuid.UUID(bytes=data[offset : offset + 16]), offset + 16
+        elif tag == b"i":
+            (value,) = struct.unpack_from(">q", data, offset)
+            return value, offset + 8
+        elif tag == b"s":
+            (length,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+
+            if len(data) < offset + length:
+                raise ValueError("Truncated cursor")
+
+            return data[offset : offset + length].decode(), offset + length
+        else:
+            raise ValueError("Unknown cursor value type")
+
+
+def get_cursor_codec() -> CursorCodec:
+    return import_string(settings.PAGINATION_CURSOR_CODEC)()
+
+
+class Pagination(RequestStream):
+    def __init__(
         self,
-        request_iterator: Iterator[pagination_pb2.Page],
-        query: QuerySet,
+        request_iterator: Iterable[pagination_pb2.Page],
+        query: Optional[QuerySet],
         bundle_class: Type,
         adapter: PaginationAdapter,
         message_overrides: dict = {},
         on_items: Optional[Callable[[list], None]] = None,
     ):
-        bundle_field = re.sub(r"(?<!^)(?=[A-Z])", "_", bundle_class.__name__).lower()
-        size = 0
-        query = adapter.order_queryset(query)
-
-        for request in request_iterator:
-            items = query
-
-            if not request.forward:
-                items = items.reverse()
-
-            previous_cursor = None
-            next_cursor = None
-            position_type = request.WhichOneof("position")
-            is_cursor = position_type == "cursor"
-            has_previous = False
-            has_next = False
-
-            if is_cursor:
-                filters = adapter.make_queryset_filters(request)
-
-                items = items.filter(filters).select_related()
-
-                if request.cursor.is_next:
-                    items = items[: size + 1]
-                    has_previous = True
-                else:
-                    items = items[:size]
-                    has_next = True
-            else:
-                size = request.size
-                items = items[: size + 1]
+        super().__init__(request_iterator)
+        self.bundle_class = bundle_class
+        self.bundle_field = re.sub(
+            r"(?<!^)(?=[A-Z])", "_", bundle_class.__name__
+        ).lower()
+        self.adapter = adapter
+        self.message_overrides = message_overrides
+        self.on_items = on_items
+        self.size = 0
+        self.codec = get_cursor_codec()
+        self.query = None
 
-            if not (0 < size <= settings.PAGINATION_MAX_SIZE):
-                raise InvalidArgument("invalid_size")
+        if query is not None:
+            self.set_query(query)
 
-            items = list(items)
-            item_count = len(items)
+    def set_query(self, query: QuerySet):
+        self.query = self.adapter.prefetch_queryset(self.adapter.order_queryset(query))
 
-            if item_count == 0:
-                yield bundle_class(**{bundle_field: []})
-                continue
+    def handle(self, request: pagination_pb2.Page) -> Iterator[Message]:
+        adapter = self.adapter
+        codec = self.codec
+        items = self.query
 
-            if item_count > size:
-                items.pop()
-                item_count -= 1
+        if not request.forward:
+            items = items.reverse()
 
-                if is_cursor and not request.cursor.is_next:
-                    has_previous = True
-                else:
-                    has_next = True
+        previous_cursor = None
+        next_cursor = None
+        position_type = request.WhichOneof("position")
+        is_cursor = position_type == "cursor"
+        has_previous = False
+        has_next = False
 
-            if has_previous:
-                previous_cursor = pagination_pb2.Cursor(
-                    data=adapter.make_cursor_data(items[0]), is_next=False
-                )
+        if is_cursor:
+            values = codec.decode(adapter, request.cursor)
+            filters = adapter.make_queryset_filters(request, values)
 
-            if has_next:
-                next_cursor = pagination_pb2.Cursor(
-                    data=adapter.make_cursor_data(items[-1]), is_next=True
-                )
+            items = items.filter(filters).select_related()
+
+            if request.cursor.is_next:
+                items = items[: self.size + 1]
+                has_previous = True
+            else:
+                items = items[: self.size]
+                has_next = True
+        else:
+            self.size = request.size
+            items = items[: self.size + 1]
 
-            if on_items:
-                on_items(items)
-
-            yield bundle_class(
-                **{
-                    bundle_field: [
-                        adapter.make_message(p, **message_overrides) for p in items
-                    ],
-                    "previous": previous_cursor,
-                    "next": next_cursor,
-                }
+        if not (0 < self.size <= settings.PAGINATION_MAX_SIZE):
+            raise InvalidArgument("invalid_size")
+
+        items = list(items)
+        item_count = len(items)
+
+        if item_count == 0:
+            yield self.bundle_class(**{self.bundle_field: []})
+            return
+
+        if item_count > self.size:
+            items.pop()
+            item_count -= 1
+
+            if is_cursor and not request.cursor.is_next:
+                has_previous = True
+            else:
+                has_next = True
+
+        if has_previous:
+            previous_cursor = pagination_pb2.Cursor(
+                data=codec.encode(adapter, items[0]), is_next=False
             )
+
+        if has_next:
+            next_cursor = pagination_pb2.Cursor(
+                data=codec.encode(adapter, items[-1]), is_next=True
+            )
+
+        if self.on_items:
+            self.on_items(items)
+
+        yield self.bundle_class(
+            **{
+                self.bundle_field: [
+                    adapter.make_message(p, **self.message_overrides) for p in items
+                ],
+                "previous": previous_cursor,
+                "next": next_cursor,
+            }
+        )
+
+
+class PaginatorMixin:
+    def paginate(
+        self,
+        request_iterator: Iterable[pagination_pb2.Page],
+        query: QuerySet,
+        bundle_class: Type,
+        adapter: PaginationAdapter,
+        message_overrides: dict = {},
+        on_items: Optional[Callable[[list], None]] = None,
+    ) -> Pagination:
+        return Pagination(
+            request_iterator,
+            query,
+            bundle_class=bundle_class,
+            adapter=adapter,
+            message_overrides=message_overrides,
+            on_items=on_items,
+        )
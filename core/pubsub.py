@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .aio import current_executor, run_sync
+
+logger = logging.getLogger(__name__)
+
+MessageCallback = Callable[[str, str], None]
+
+
+class Backend(ABC):
+    def __init__(self, on_message: MessageCallback, **kwargs):
+        self.on_message = on_message
+
+    @abstractmethod
+    def publish(self, channel: str, message: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def subscribe(self, channel: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def unsubscribe(self, channel: str):
+        raise NotImplementedError
+
+
+class LocalBackend(Backend):
+    def __init__(self, on_message: MessageCallback, **kwargs):
+        super().__init__(on_message, **kwargs)
+        self._channels = set()
+
+    def publish(self, channel: str, message: str):
+        if channel in self._channels:
+            self.on_message(channel, message)
+
+    def subscribe(self, channel: str):
+        self._channels.add(channel)
+
+    def unsubscribe(self, channel: str):
+        self._channels.discard(channel)
+
+
+class RedisBackend(Backend):
+    def __init__(self, on_message: MessageCallback, url: str, **kwargs):
+        import redis
+
+        super().__init__(on_message, **kwargs)
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._thread = None
+
+    def publish(self, channel: str, message: str):
+        self._client.publish(channel, message)
+
+    def subscribe(self, channel: str):
+        self._pubsub.subscribe(**{channel: self._handle_message})
+
+        if not self._thread:
+            self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def unsubscribe(self, channel: str):
+        self._pubsub.unsubscribe(channel)
+
+    def _handle_message(self, message: dict):
+        self.on_message(message["channel"].decode(), message["data"].decode())
+
+
+class Subscription:
+    def __init__(self, hub: "Hub", channels: Iterable[str]):
+        self.channels = list(channels)
+        self.is_closed = False
+        self._hub = hub
+        self._event = threading.Event()
+        self._loop = None
+        self._async_event = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        with self._lock:
+            self._event.set()
+
+            if self._loop:
+                self._loop.call_soon_threadsafe(self._async_event.set)
+
+    def close(self):
+        if not self.is_closed:
+            self.is_closed = True
+            self._hub.unsubscribe(self)
+            self.notify()
+
+    def wait(self) -> bool:
+        self._event.wait()
+        self._event.clear()
+        return not self.is_closed
+
+    async def async_wait(self) -> bool:
+        with self._lock:
+            if not self._loop:
+                self._loop = asyncio.get_running_loop()
+                self._async_event = asyncio.Event()
+
+                if self._event.is_set():
+                    self._async_event.set()
+
+        await self._async_event.wait()
+        self._async_event.clear()
+        self._event.clear()
+        return not self.is_closed
+
+
+class SubscriptionStream:
+    def __init__(self, subscription: Subscription, make_message: Callable):
+        self.subscription = subscription
+        self.make_message = make_message
+        self._started = False
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self) -> Any:
+        if self._started and not self.subscription.wait():
+            raise StopIteration
+
+        self._started = True
+        return self.make_message()
+
+    def __aiter__(self) -> AsyncIterator:
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._started and not await self.subscription.async_wait():
+            raise StopAsyncIteration
+
+        self._started = True
+        return await run_sync(current_executor.get(), self.make_message)
+
+    def close(self):
+        self.subscription.close()
+
+
+class Hub:
+    def __init__(self, backend_class: type, **options):
+        self.backend = backend_class(on_message=self.dispatch, **options)
+        self._subscriptions = defaultdict(set)
+        self._listeners = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, message: str = ""):
+        try:
+            self.backend.publish(channel, message)
+        except Exception:
+            logger.exception(f"Could not publish to {channel}")
+
+    def subscribe(self, *channels: str) -> Subscription:
+        subscription = Subscription(self, channels)
+
+        with self._lock:
+            for channel in channels:
+                if not self.is_subscribed(channel):
+                    self.backend.subscribe(channel)
+
+                self._subscriptions[channel].add(subscription)
+
+        return subscription
+
+    def listen(self, channel: str, callback: MessageCallback):
+        with self._lock:
+            if not self.is_subscribed(channel):
+                self.backend.subscribe(channel)
+
+            self._listeners[channel].append(callback)
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel, set())
+                subscriptions.discard(subscription)
+
+                if not subscriptions:
+                    self._subscriptions.pop(channel, None)
+
+                    if not self.is_subscribed(channel):
+                        self.backend.unsubscribe(channel)
+
+    def dispatch(self, channel: str, message: str):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, []))
+            listeners = list(self._listeners.get(channel, []))
+
+        for subscription in subscriptions:
+            subscription.notify()
+
+        for listener in listeners:
+            try:
+                listener(channel, message)
+            except Exception:
+                logger.exception(f"Could not handle message on {channel}")
+
+    def is_subscribed(self, channel: str) -> bool:
+        return bool(self._subscriptions.get(channel) or self._listeners.get(channel))
+
+    def get_subscription_count(self, channel: str) -> int:
+        with self._lock:
+            return len(self._subscriptions.get(channel, []))
+
+
+hub = Hub(import_string(settings.PUBSUB_BACKEND), url=settings.PUBSUB_URL)
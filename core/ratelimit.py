@@ -0,0 +1,145 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Iterable, Tuple
+
+import grpc
+from django.conf import settings
+from django.utils.module_loading import import_string
+from grpc_interceptor.exceptions import ResourceExhausted
+
+logger = logging.getLogger(__name__)
+
+Limit = Tuple[str, int, float]
+
+
+def rate_limit(*limits: Limit) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        func.__dict__["rate_limits"] = list(limits)
+        return func
+
+    return decorator
+
+
+class Backend(ABC):
+    def __init__(self, **kwargs):
+        pass
+
+    @abstractmethod
+    def consume(self, key: str, capacity: int, period: float) -> bool:
+        raise NotImplementedError
+
+
+class MemoryBackend(Backend):
+    def __init__(self, max_size: int = 100000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, capacity: int, period: float) -> bool:
+        timestamp = monotonic()
+
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (capacity, timestamp))
+            tokens = min(capacity, tokens + (timestamp - last) * capacity / period)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, timestamp)
+
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+
+        return allowed
+
+
+class RedisBackend(Backend):
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local period = tonumber(ARGV[2])
+        local time = redis.call("TIME")
+        local timestamp = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local bucket = redis.call("HMGET", KEYS[1], "tokens", "timestamp")
+        local tokens = tonumber(bucket[1]) or capacity
+        local last = tonumber(bucket[2]) or timestamp
+        tokens = math.min(capacity, tokens + (timestamp - last) * capacity / period)
+        local allowed = 0
+
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+
+        redis.call("HSET", KEYS[1], "tokens", tostring(tokens))
+        redis.call("HSET", KEYS[1], "timestamp", tostring(timestamp))
+        redis.call("PEXPIRE", KEYS[1], math.ceil(period * 1000))
+        return allowed
+    """
+
+    def __init__(self, url: str, **kwargs):
+        import redis
+
+        super().__init__(**kwargs)
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def consume(self, key: str, capacity: int, period: float) -> bool:
+        return bool(self._script(keys=[f"ratelimit:{key}"], args=[capacity, period]))
+
+
+def get_peer_address(context: grpc.ServicerContext) -> str:
+    peer = context.peer()
+
+    if peer.startswith(("ipv4:", "ipv6:")):
+        return peer.rsplit(":", 1)[0]
+
+    return peer
+
+
+def get_limit_value(key: str, request: Any, context: grpc.ServicerContext) -> Any:
+    if key == "peer":
+        return get_peer_address(context)
+    elif key == "caller":
+        caller = getattr(context, "caller", None)
+        return caller and caller.id
+    elif isinstance(value := getattr(request, key, None), str):
+        return value.strip().lower()
+    else:
+        return value
+
+
+class RateLimiter:
+    def __init__(self, backend_class: type, **options):
+        self.backend = backend_class(**options)
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def check(
+        self,
+        method_name: str,
+        limits: Iterable[Limit],
+        request: Any,
+        context: grpc.ServicerContext,
+    ):
+        for key, capacity, period in limits:
+            if not (value := get_limit_value(key, request, context)):
+                continue
+
+            if not self.consume(f"{method_name}:{key}:{value}", capacity, period):
+                with self._lock:
+                    self.rejected += 1
+
+                raise ResourceExhausted("rate_limited")
+
+    def consume(self, key: str, capacity: int, period: float) -> bool:
+        try:
+            return self.backend.consume(key, capacity, period)
+        except Exception:
+            logger.exception(f"Could not consume from {key}")
+            return True
+
+
+rate_limiter = RateLimiter(
+    import_string(settings.RATE_LIMIT_BACKEND), url=settings.RATE_LIMIT_URL
+)
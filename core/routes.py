@@ -0,0 +1,142 @@
+from importlib import import_module
+from inspect import getmembers
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+)
+
+import grpc
+from django.conf import settings
+from google.protobuf import descriptor_pb2, empty_pb2, struct_pb2
+from grpc_interceptor.exceptions import PermissionDenied
+
+from .authentication import QueryBudget, query_budget
+from .metrics import RouteMetrics
+from .ratelimit import Limit
+from .services import get_service_full_name, get_servicer_interfaces
+
+
+class Route(NamedTuple):
+    name: str
+    no_auth: bool
+    request_streaming: bool
+    response_streaming: bool
+    rate_limits: Tuple[Limit, ...]
+    deadline: Optional[float]
+    query_budget: Optional[QueryBudget]
+    metrics: RouteMetrics
+
+    def to_dict(self) -> dict:
+        data = self._asdict()
+        del data["metrics"]
+        data["rate_limits"] = [list(limit) for limit in self.rate_limits]
+
+        if self.query_budget:
+            data["query_budget"] = self.query_budget._asdict()
+
+        return data
+
+
+def make_method_name(service_name: str, method_name: str) -> str:
+    return f"/{service_name}/{method_name}"
+
+
+def make_route(
+    name: str, member: Callable, request_streaming: bool, response_streaming: bool
+) -> Route:
+    attributes = getattr(member, "__dict__", {})
+    rate_limits = settings.RATE_LIMITS.get(name, attributes.get("rate_limits", []))
+    deadline = settings.RPC_DEADLINE_BUDGETS.get(
+        name, None if response_streaming else settings.RPC_DEADLINE_BUDGET
+    )
+    return Route(
+        name=name,
+        no_auth=attributes.get("no_auth", False),
+        request_streaming=request_streaming,
+        response_streaming=response_streaming,
+        rate_limits=tuple(tuple(limit) for limit in rate_limits),
+        deadline=deadline,
+        query_budget=attributes.get("query_budget"),
+        metrics=RouteMetrics(name),
+    )
+
+
+def iterate_methods(
+    services: List[Type[Any]],
+) -> Iterator[Tuple[str, Type[Any], str, bool, bool]]:
+    for service in services:
+        servicers = get_servicer_interfaces(service)
+
+        for servicer in servicers:
+            module = import_module(servicer.__module__.replace("pb2_grpc", "pb2"))
+            descriptor = module.DESCRIPTOR.services_by_name[
+                servicer.__name__[: -len("Servicer")]
+            ]
+            service_proto = descriptor_pb2.ServiceDescriptorProto()
+            descriptor.CopyToProto(service_proto)
+            service_name = get_service_full_name(servicer)
+
+            for method in service_proto.method:
+                name = make_method_name(service_name, method.name)
+                yield (
+                    name,
+                    service,
+                    method.name,
+                    method.client_streaming,
+                    method.server_streaming,
+                )
+
+        for member_name, member in getmembers(service):
+            if spec := getattr(member, "__dict__", {}).get("rpc_method"):
+                service_name = get_service_full_name(servicers[0])
+                name = make_method_name(service_name, member_name)
+                yield name, service, member_name, False, spec[2]
+
+
+def get_routes(services: List[Type[Any]]) -> Mapping[str, Route]:
+    routes = {}
+
+    for name, service, member_name, *streaming in iterate_methods(services):
+        routes[name] = make_route(name, getattr(service, member_name), *streaming)
+
+    name = make_method_name(RouteService.name, "List")
+    routes[name] = make_route(name, RouteService.List, False, False)
+    return MappingProxyType(routes)
+
+
+class RouteService:
+    name = "core.RouteService"
+
+    def __init__(self, routes: Mapping[str, Route]):
+        self.routes = routes
+
+    @query_budget(per_call=0)
+    def List(
+        self, request: empty_pb2.Empty, context: grpc.ServicerContext
+    ) -> struct_pb2.ListValue:
+        if not context.caller.is_staff:
+            raise PermissionDenied("caller_not_staff")
+
+        routes = struct_pb2.ListValue()
+        routes.extend([route.to_dict() for route in self.routes.values()])
+        return routes
+
+    def get_handler(self) -> grpc.GenericRpcHandler:
+        return grpc.method_handlers_generic_handler(
+            self.name,
+            {
+                "List": grpc.unary_unary_rpc_method_handler(
+                    self.List,
+                    request_deserializer=empty_pb2.Empty.FromString,
+                    response_serializer=struct_pb2.ListValue.SerializeToString,
+                )
+            },
+        )
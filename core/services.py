@@ -1,5 +1,6 @@
-import io
+from importlib import import_module
 from inspect import isclass
+from tempfile import SpooledTemporaryFile
 from typing import Any, Callable, Iterator, List, Optional, Type, Union
 
 import magic
@@ -10,6 +11,8 @@ from grpc_interceptor.exceptions import InvalidArgument
 
 from protos import image_pb2
 
+from .tasks import transcode_image
+
 MaybeImageChunk = Union[image_pb2.ImageChunk, Any]
 
 
@@ -21,6 +24,25 @@ def get_servicer_interfaces(cls: type) -> List[type]:
     )
 
 
+def get_service_full_name(servicer: type) -> str:
+    module = import_module(servicer.__module__.replace("pb2_grpc", "pb2"))
+    return f"{module.DESCRIPTOR.package}.{servicer.__name__[: -len('Servicer')]}"
+
+
+def rpc_method(
+    request_class: type, response_class: type, response_streaming: bool = False
+) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        func.__dict__["rpc_method"] = (
+            request_class,
+            response_class,
+            response_streaming,
+        )
+        return func
+
+    return decorator
+
+
 class ImageUploadMixin:
     def get_image(
         self,
@@ -28,33 +50,48 @@ class ImageUploadMixin:
         request_iterator: Iterator,
         chunkator: Optional[Callable[[MaybeImageChunk], MaybeImageChunk]] = None,
     ) -> Optional[ImageFile]:
-        data = bytes()
-        type_checked = False
+        file = SpooledTemporaryFile(max_size=settings.IMAGE_UPLOAD_SPOOL_SIZE)
+        header = bytearray()
+        size = 0
         extension = ""
 
         def validate_type():
             nonlocal extension
-            mime = magic.from_buffer(data, mime=True)
+            mime = magic.from_buffer(bytes(header), mime=True)
 
             if mime in settings.VALID_IMAGE_MIMES:
                 extension = mime.split("/")[-1]
             else:
                 raise InvalidArgument("invalid_file_type")
 
-        for request in request_iterator:
-            data += chunkator(request).data if chunkator else request.data
-            size = len(data)
+        try:
+            for request in request_iterator:
+                data = chunkator(request).data if chunkator else request.data
+                size += len(data)
 
-            if size >= 2048 and not type_checked:
-                validate_type()
-                type_checked = True
-            if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
-                raise InvalidArgument("payload_too_large")
+                if len(header) < 2048:
+                    header += memoryview(data)[: 2048 - len(header)]
 
-        if data and not type_checked:
-            validate_type()
+                    if len(header) == 2048:
+                        validate_type()
 
-        return ImageFile(io.BytesIO(data), name=f"{name}.{extension}") if data else None
+                if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+                    raise InvalidArgument("payload_too_large")
+
+                file.write(data)
+
+            if not size:
+                file.close()
+                return None
+
+            if len(header) < 2048:
+                validate_type()
+        except Exception:
+            file.close()
+            raise
+
+        file.seek(0)
+        return ImageFile(file, name=f"{name}.{extension}")
 
     def set_image(
         self, model: Type[models.Model], field: str, image: Optional[ImageFile]
@@ -63,3 +100,11 @@ class ImageUploadMixin:
         setattr(model, field, image)
         model.clean_fields()
         model.save()
+
+        if image:
+            transcode_image.delay(
+                model=model._meta.label,
+                pk=str(model.pk),
+                field=field,
+                name=getattr(model, field).name,
+            )
@@ -1,3 +1,4 @@
+import json
 import os
 import re
 from pathlib import Path
@@ -152,10 +153,24 @@ PASSWORD_HASHERS = [
     ]
 ]
 
+PASSWORD_HASHING_WORKERS = int(
+    os.getenv("PASSWORD_HASHING_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))
+)
+
+PASSWORD_HASHING_QUEUE_SIZE = int(os.getenv("PASSWORD_HASHING_QUEUE_SIZE", "16"))
+
 # JSON Web Tokens
 
 JWT_ALGORITHM = "HS256"
 
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+PRINCIPAL_CACHE_TIMEOUT = int(os.getenv("PRINCIPAL_CACHE_TIMEOUT", "60"))
+
+CONNECTION_USAGE_FLUSH_INTERVAL = int(
+    os.getenv("CONNECTION_USAGE_FLUSH_INTERVAL", "30")
+)
+
 # Internationalization
 
 LANGUAGE_CODE = "en-us"
@@ -180,6 +195,14 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 FILE_UPLOAD_MAX_MEMORY_SIZE = 1 * 1024 * 1024
 
+IMAGE_UPLOAD_SPOOL_SIZE = 256 * 1024
+
+IMAGE_VARIANT_WIDTHS = [256, 640, 1280]
+
+IMAGE_VARIANT_QUALITY = 80
+
+TRASH_BATCH_SIZE = int(os.getenv("TRASH_BATCH_SIZE", "1000"))
+
 DEFAULT_FILE_STORAGE = "core.storages.FileSystemStorage"
 
 VALID_IMAGE_MIMES = [f"image/{i}" for i in ("png", "jpeg")]
@@ -228,6 +251,7 @@ CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 CELERY_IGNORE_RESULT = True
 
 CELERY_QUEUES = {
+    "core.tasks.empty_trash": {"queue": "trash"},
     "*.send_*": {"queue": "messaging"},
     "*.remove_*": {"queue": "trash"},
     "*.cleanup_*": {"queue": "trash"},
@@ -236,6 +260,10 @@ CELERY_QUEUES = {
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
 CELERY_BEAT_SCHEDULE = {
+    "core.empty_trash": {
+        "task": "core.tasks.empty_trash",
+        "schedule": crontab(minute="*/5"),
+    },
     "users.cleanup_users": {
         "task": "users.tasks.cleanup_users",
         "schedule": crontab(minute=0),
@@ -248,10 +276,54 @@ CELERY_BEAT_SCHEDULE = {
         "task": "posts.tasks.cleanup_stacks",
         "schedule": crontab(minute=0),
     },
+    "posts.cleanup_orphans": {
+        "task": "posts.tasks.cleanup_orphans",
+        "schedule": crontab(hour=0, minute=0),
+    },
 }
 
 # Other
 
 PAGINATION_MAX_SIZE = 50
 
+PAGINATION_CURSOR_CODEC = os.getenv(
+    "PAGINATION_CURSOR_CODEC", "core.pagination.TextCursorCodec"
+)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "core.pubsub.RedisBackend")
+
+PUBSUB_URL = os.getenv("PUBSUB_URL", CELERY_BROKER_URL)
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "core.ratelimit.MemoryBackend")
+
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", CELERY_BROKER_URL)
+
+RATE_LIMITS = json.loads(os.getenv("RATE_LIMITS", "{}"))
+
+RPC_DEADLINE_BUDGET = float(os.getenv("RPC_DEADLINE_BUDGET", "5"))
+
+RPC_DEADLINE_BUDGETS = json.loads(os.getenv("RPC_DEADLINE_BUDGETS", "{}"))
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+QUERY_BUDGET_STRICT = str_to_bool(os.getenv("QUERY_BUDGET_STRICT", "false"))
+
+FEED_POOL_TIMEOUT = int(os.getenv("FEED_POOL_TIMEOUT", "60"))
+
+FEED_CANDIDATE_BATCH_SIZE = int(os.getenv("FEED_CANDIDATE_BATCH_SIZE", "100"))
+
+FEED_VOTE_BATCH_SIZE = int(os.getenv("FEED_VOTE_BATCH_SIZE", "10"))
+
+FEED_VOTE_BATCH_WINDOW = float(os.getenv("FEED_VOTE_BATCH_WINDOW", "2"))
+
+STACK_CLEANUP_CHUNK_SIZE = int(os.getenv("STACK_CLEANUP_CHUNK_SIZE", "1000"))
+
+SOFT_DELETE_CHUNK_SIZE = int(os.getenv("SOFT_DELETE_CHUNK_SIZE", "500"))
+
+POST_DATA_CHUNK_SIZE = int(os.getenv("POST_DATA_CHUNK_SIZE", "500"))
+
+NOTIFICATIONS_FAN_OUT_CHUNK_SIZE = int(
+    os.getenv("NOTIFICATIONS_FAN_OUT_CHUNK_SIZE", "1000")
+)
+
 GRAVATAR_BASE_URL = "https://www.gravatar.com"
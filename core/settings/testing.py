@@ -5,3 +5,13 @@ CELERY_TASK_ALWAYS_EAGER = True
 CELERY_EAGER_PROPAGATES = True
 
 GRAVATAR_BASE_URL = None
+
+CONNECTION_USAGE_FLUSH_INTERVAL = 0
+
+FEED_POOL_TIMEOUT = 0
+
+PASSWORD_HASHING_WORKERS = 0
+
+QUERY_BUDGET_STRICT = True
+
+PUBSUB_BACKEND = "core.pubsub.LocalBackend"
@@ -2,3 +2,4 @@ from django.db.models.signals import ModelSignal
 
 pre_soft_delete = ModelSignal(use_caching=True)
 post_soft_delete = ModelSignal(use_caching=True)
+post_bulk_soft_delete = ModelSignal(use_caching=True)
@@ -1,11 +1,16 @@
+import hashlib
 import os
-from typing import Optional, Union
+import re
+from typing import Iterable, List, Optional, Union
 from uuid import uuid4
 
 from django.conf import settings
+from django.core.files import File
 from django.core.files.storage import FileSystemStorage as BaseStorage
 from django.db.models.fields.files import ImageFieldFile
 
+SHARDED_NAME = re.compile(r"(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}[^/]*$")
+
 
 def get_image_url(url: Union[str, ImageFieldFile]) -> str:
     url = str(url)
@@ -13,7 +18,116 @@ def get_image_url(url: Union[str, ImageFieldFile]) -> str:
 
 
 class FileSystemStorage(BaseStorage):
+    def save(
+        self, name: Optional[str], content: File, max_length: Optional[int] = None
+    ) -> str:
+        from .models import StoredFile
+
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = self.get_content_name(name, content)
+
+        if not self.exists(name):
+            name = self._save(name, content)
+
+        StoredFile.objects.acquire(self.get_root_name(name))
+        return name
+
     def get_available_name(self, name: str, max_length: Optional[int] = None) -> str:
         dir_name, file_name = os.path.split(name)
         _, file_ext = os.path.splitext(file_name)
         return os.path.join(dir_name, f"{uuid4()}{file_ext}")
+
+    def get_content_name(self, name: str, content: File) -> str:
+        digest = hashlib.sha256()
+
+        for chunk in content.chunks():
+            digest.update(chunk)
+
+        content.seek(0)
+        dir_name, file_name = os.path.split(name)
+        _, file_ext = os.path.splitext(file_name)
+        file_hash = digest.hexdigest()
+        return os.path.join(
+            dir_name, file_hash[:2], file_hash[2:4], f"{file_hash}{file_ext}"
+        )
+
+    def get_variant_name(self, name: str, width: int) -> str:
+        return f"{self.get_root_name(name)}.{width}.webp"
+
+    def get_original_names(self, name: str) -> List[str]:
+        root_name = self.get_root_name(name)
+        return [
+            f"{root_name}.{mime.split('/')[-1]}" for mime in settings.VALID_IMAGE_MIMES
+        ]
+
+    def get_related_names(self, name: str) -> List[str]:
+        return self.get_original_names(name) + [
+            self.get_variant_name(name, w) for w in settings.IMAGE_VARIANT_WIDTHS
+        ]
+
+    def get_root_name(self, name: str) -> str:
+        dir_name, file_name = os.path.split(name)
+        return os.path.join(dir_name, file_name.split(".")[0])
+
+    def save_variant(self, name: str, width: int, content: File) -> str:
+        variant_name = self.get_variant_name(name, width)
+        return (
+            variant_name
+            if self.exists(variant_name)
+            else self._save(variant_name, content)
+        )
+
+    def is_sharded(self, name: str) -> bool:
+        return SHARDED_NAME.search(name) is not None
+
+    def migrate(self, name: str) -> str:
+        from .models import StoredFile
+
+        if self.is_sharded(name):
+            return name
+
+        root_name = self.get_root_name(name)
+        source = next(
+            (n for n in self.get_original_names(name) if self.exists(n)), name
+        )
+
+        with self.open(source) as file:
+            new_root_name = self.get_root_name(self.get_content_name(source, file))
+
+        for related_name in {name, *self.get_related_names(name)}:
+            if not self.exists(related_name):
+                continue
+
+            target = new_root_name + related_name[len(root_name) :]
+
+            if self.exists(target):
+                super().delete(related_name)
+            else:
+                os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+                os.replace(self.path(related_name), self.path(target))
+
+        StoredFile.objects.acquire(new_root_name)
+        return new_root_name + name[len(root_name) :]
+
+    def delete(self, name: str):
+        self.delete_many([name])
+
+    def delete_many(self, names: Iterable[str]):
+        from .models import StoredFile, TrashedFile
+
+        TrashedFile.objects.bulk_create(
+            [
+                TrashedFile(name=name)
+                for name in names
+                if StoredFile.objects.release(self.get_root_name(name))
+            ]
+        )
+
+    def purge(self, name: str):
+        for related_name in {name, *self.get_related_names(name)}:
+            super().delete(related_name)
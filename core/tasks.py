@@ -0,0 +1,75 @@
+import io
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.transaction import atomic
+from PIL import Image, ImageOps
+
+from .models import StoredFile, TrashedFile
+
+
+@shared_task
+def transcode_image(model: str, pk: str, field: str, name: str):
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+
+    if not widths:
+        return
+
+    model_class = apps.get_model(model)
+    image_field = model_class._meta.get_field(field)
+    storage = image_field.storage
+
+    with storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+
+    # Only the variant that replaces the original is served, so narrower
+    # widths are not rendered.
+    width = next((w for w in widths if w >= image.width), widths[-1])
+    variant = image.copy()
+    variant.thumbnail((width, variant.height))
+    data = io.BytesIO()
+    variant.save(data, "WEBP", quality=settings.IMAGE_VARIANT_QUALITY)
+    variant_name = storage.save_variant(name, width, ContentFile(data.getvalue()))
+    values = {field: variant_name}
+
+    if image_field.width_field:
+        values[image_field.width_field] = variant.width
+
+    if image_field.height_field:
+        values[image_field.height_field] = variant.height
+
+    model_class._base_manager.filter(pk=pk, **{field: name}).update(**values)
+
+
+@shared_task
+def empty_trash() -> int:
+    count = 0
+
+    while trashed_files := list(
+        TrashedFile.objects.order_by("id")[: settings.TRASH_BATCH_SIZE]
+    ):
+        root_names = {default_storage.get_root_name(f.name) for f in trashed_files}
+
+        with atomic():
+            live_root_names = set(
+                StoredFile.objects.select_for_update()
+                .filter(name__in=root_names)
+                .values_list("name", flat=True)
+            )
+            TrashedFile.objects.filter(id__in=[f.id for f in trashed_files]).delete()
+
+        # Files are only purged once their trash rows are gone for good, so a
+        # rolled back batch never loses files it still lists.
+        for trashed_file in trashed_files:
+            if default_storage.get_root_name(trashed_file.name) not in live_root_names:
+                default_storage.purge(trashed_file.name)
+
+        count += len(trashed_files)
+
+    return count
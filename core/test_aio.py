@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+from unittest import IsolatedAsyncioTestCase
+
+import grpc
+from google.protobuf.wrappers_pb2 import StringValue
+
+from .aio import RequestStream
+from .interceptors import ExecutorInterceptor
+
+
+class EchoStream(RequestStream):
+    def start(self) -> Iterable[StringValue]:
+        return [StringValue(value="ready")]
+
+    def handle(self, request: StringValue) -> Iterable[StringValue]:
+        return [request]
+
+
+def join(requests: Iterator[StringValue], context) -> StringValue:
+    return StringValue(value="".join(r.value for r in requests))
+
+
+def make_handler(factory: Callable, behavior: Callable) -> grpc.RpcMethodHandler:
+    return factory(
+        behavior,
+        request_deserializer=StringValue.FromString,
+        response_serializer=StringValue.SerializeToString,
+    )
+
+
+class ExecutorInterceptor_intercept_service(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.server = grpc.aio.server(
+            interceptors=(ExecutorInterceptor(self.executor, max_buffer_size=1024),)
+        )
+        handlers = {
+            "Echo": make_handler(
+                grpc.stream_stream_rpc_method_handler,
+                lambda requests, context: EchoStream(requests),
+            ),
+            "Join": make_handler(grpc.stream_unary_rpc_method_handler, join),
+            "Retrieve": make_handler(
+                grpc.unary_unary_rpc_method_handler, lambda request, context: request
+            ),
+        }
+        self.server.add_generic_rpc_handlers(
+            (grpc.method_handlers_generic_handler("test.Service", handlers),)
+        )
+        port = self.server.add_insecure_port("127.0.0.1:0")
+        await self.server.start()
+        self.channel = grpc.aio.insecure_channel(f"127.0.0.1:{port}")
+
+    async def asyncTearDown(self):
+        await self.channel.close()
+        await self.server.stop(None)
+        self.executor.shutdown()
+
+    def get_method(self, kind: str, name: str) -> Callable:
+        return getattr(self.channel, kind)(
+            f"/test.Service/{name}",
+            request_serializer=StringValue.SerializeToString,
+            response_deserializer=StringValue.FromString,
+        )
+
+    async def open_streams(self, count: int) -> list:
+        streams = [self.get_method("stream_stream", "Echo")() for _ in range(count)]
+
+        for stream in streams:
+            self.assertEqual((await stream.read()).value, "ready")
+
+        return streams
+
+    async def test_idle_streams(self):
+        streams = await self.open_streams(3)
+        request = StringValue(value="a")
+        retrieve = self.get_method("unary_unary", "Retrieve")
+        self.assertEqual(await retrieve(request, timeout=5), request)
+
+        for stream in streams:
+            await stream.write(request)
+            self.assertEqual(await stream.read(), request)
+            await stream.done_writing()
+            self.assertIs(await stream.read(), grpc.aio.EOF)
+
+    async def test_upload(self):
+        streams = await self.open_streams(1)
+        join = self.get_method("stream_unary", "Join")
+        requests = [StringValue(value=value) for value in "abc"]
+        self.assertEqual((await join(iter(requests), timeout=5)).value, "abc")
+
+        for stream in streams:
+            stream.cancel()
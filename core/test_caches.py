@@ -0,0 +1,27 @@
+from unittest.case import TestCase
+
+from .caches import PrincipalCache
+from .pubsub import Hub, LocalBackend
+
+
+class PrincipalCache_invalidate(TestCase):
+    def setUp(self):
+        hub = Hub(LocalBackend)
+        self.cache = PrincipalCache(max_size=10, timeout=3600, hub=hub)
+        self.other_cache = PrincipalCache(max_size=10, timeout=3600, hub=hub)
+        self.other_cache.listen()
+
+        for cache in [self.cache, self.other_cache]:
+            cache.set("user", "a", ("user", "a"), cache.version)
+            cache.set("user", "b", ("user", "b"), cache.version)
+
+    def test_user(self):
+        self.cache.invalidate_user("user")
+        self.assertIsNone(self.cache.get("user", "a"))
+        self.assertIsNone(self.other_cache.get("user", "a"))
+        self.assertIsNone(self.other_cache.get("user", "b"))
+
+    def test_connection(self):
+        self.cache.invalidate_connection("user", "a")
+        self.assertIsNone(self.other_cache.get("user", "a"))
+        self.assertEqual(self.other_cache.get("user", "b"), ("user", "b"))
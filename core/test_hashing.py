@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.test import TestCase
+from grpc_interceptor.exceptions import ResourceExhausted
+
+from .hashing import PasswordHasherPool
+
+
+class PasswordHasherPool_run(TestCase):
+    def test(self):
+        pool = PasswordHasherPool(workers=0, queue_size=0)
+        encoded = pool.make_password("password")
+        self.assertTrue(check_password("password", encoded))
+
+    def test_process_pool(self):
+        pool = PasswordHasherPool(workers=1, queue_size=0)
+
+        try:
+            encoded = pool.make_password("password")
+        finally:
+            pool.shutdown()
+
+        self.assertTrue(check_password("password", encoded))
+        self.assertEqual(pool.pending, 0)
+
+    def test_overflow(self):
+        pool = PasswordHasherPool(workers=1, queue_size=1)
+        pool.pending = 2
+
+        with self.assertRaises(ResourceExhausted):
+            pool.make_password("password")
+
+        self.assertEqual(pool.pending, 2)
+        self.assertEqual(pool.rejected, 1)
+
+    def test_server_workers(self):
+        pool = PasswordHasherPool(workers=4, queue_size=16)
+        pool.limit_to(4)
+        pool.pending = 3
+
+        with self.assertRaises(ResourceExhausted):
+            pool.make_password("password")
+
+        self.assertEqual(pool.rejected, 1)
+
+
+class PasswordHasherPool_check_password(TestCase):
+    def setUp(self):
+        self.pool = PasswordHasherPool(workers=0, queue_size=0)
+        self.user = get_user_model().objects.create_user(
+            username="user", email="user@example.com"
+        )
+
+    def test(self):
+        self.user.password = make_password("password")
+        self.assertTrue(self.pool.check_password(self.user, "password"))
+        self.assertFalse(self.pool.check_password(self.user, "wrong"))
+
+    def test_upgrade(self):
+        self.user.password = make_password("password", hasher="pbkdf2_sha256")
+        self.user.save()
+        self.assertTrue(self.pool.check_password(self.user, "password"))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2"))
+
+    def test_unusable(self):
+        self.user.set_unusable_password()
+        self.assertFalse(self.pool.check_password(self.user, "password"))
+
+
+class PasswordHasherPool_check_password_process_pool(TestCase):
+    def setUp(self):
+        self.pool = PasswordHasherPool(workers=1, queue_size=0)
+        self.user = get_user_model().objects.create_user(
+            username="user", email="user@example.com"
+        )
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test(self):
+        self.user.password = make_password("password")
+        self.assertTrue(self.pool.check_password(self.user, "password"))
+        self.assertFalse(self.pool.check_password(self.user, "wrong"))
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_upgrade(self):
+        self.user.password = make_password("password", hasher="pbkdf2_sha256")
+        self.user.save()
+        self.assertTrue(self.pool.check_password(self.user, "password"))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2"))
@@ -0,0 +1,108 @@
+import grpc
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from grpc_interceptor.exceptions import NotFound
+
+from .authentication import query_budget
+from .interceptors import MetricsInterceptor
+from .metrics import Counter, Histogram, QueryBudgetExceeded, Registry
+from .routes import make_route
+from .tests import FakeContext
+
+
+class Registry_render(TestCase):
+    def test(self):
+        registry = Registry()
+        counter = registry.register(Counter("calls_total", "Calls.", ["method"]))
+        counter.labels('/a."b"').inc()
+        self.assertEqual(
+            registry.render(),
+            "# HELP calls_total Calls.\n"
+            "# TYPE calls_total counter\n"
+            'calls_total{method="/a.\\"b\\""} 1\n',
+        )
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.register(Histogram("size", "Size.", buckets=(1, 10)))
+        histogram.labels().observe(5)
+        histogram.labels().observe(50)
+        lines = registry.render().splitlines()
+        self.assertIn('size_bucket{le="1"} 0', lines)
+        self.assertIn('size_bucket{le="10"} 1', lines)
+        self.assertIn('size_bucket{le="+Inf"} 2', lines)
+        self.assertIn("size_sum 55", lines)
+        self.assertIn("size_count 2", lines)
+
+
+class MetricsInterceptor_intercept(TestCase):
+    def setUp(self):
+        name = f"/test.Service/{self._testMethodName}"
+        self.unary = make_route(name + "Unary", lambda: None, False, False)
+        self.stream = make_route(name + "Stream", lambda: None, False, True)
+        self.interceptor = MetricsInterceptor(
+            {route.name: route for route in [self.unary, self.stream]}
+        )
+
+    def test(self):
+        def method(request, context):
+            return list(get_user_model().objects.all())
+
+        self.interceptor.intercept(method, None, FakeContext(), self.unary.name)
+        metrics = self.unary.metrics
+        self.assertEqual(metrics.handling_seconds.count, 1)
+        self.assertEqual(metrics.in_flight.value, 0)
+        self.assertEqual(metrics.db_queries.sum, 1)
+        self.assertEqual(metrics.get_handled(grpc.StatusCode.OK).value, 1)
+
+    def test_error(self):
+        def method(request, context):
+            raise NotFound
+
+        with self.assertRaises(NotFound):
+            self.interceptor.intercept(method, None, FakeContext(), self.unary.name)
+
+        metrics = self.unary.metrics
+        self.assertEqual(metrics.in_flight.value, 0)
+        self.assertEqual(metrics.get_handled(grpc.StatusCode.NOT_FOUND).value, 1)
+
+    def test_stream(self):
+        def method(request, context):
+            for _ in range(3):
+                yield list(get_user_model().objects.all())
+
+        responses = self.interceptor.intercept(
+            method, None, FakeContext(), self.stream.name
+        )
+        self.assertEqual(self.stream.metrics.in_flight.value, 1)
+        self.assertEqual(len(list(responses)), 3)
+        metrics = self.stream.metrics
+        self.assertEqual(metrics.in_flight.value, 0)
+        self.assertEqual(metrics.messages_sent.value, 3)
+        self.assertEqual(metrics.db_queries.sum, 3)
+
+    def test_query_budget(self):
+        @query_budget(per_call=0)
+        def method(request, context):
+            return list(get_user_model().objects.all())
+
+        route = make_route(self.unary.name + "Budget", method, False, False)
+        interceptor = MetricsInterceptor({route.name: route})
+
+        with self.assertRaises(QueryBudgetExceeded):
+            interceptor.intercept(method, None, FakeContext(), route.name)
+
+    def test_query_budget_per_message(self):
+        @query_budget(per_message=1)
+        def method(request, context):
+            yield list(get_user_model().objects.all())
+            yield [*get_user_model().objects.all(), *get_user_model().objects.all()]
+
+        route = make_route(self.stream.name + "Budget", method, False, True)
+        interceptor = MetricsInterceptor({route.name: route})
+        responses = interceptor.intercept(method, None, FakeContext(), route.name)
+        next(responses)
+        list(get_user_model().objects.all())
+
+        with self.assertRaises(QueryBudgetExceeded):
+            next(responses)
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.utils import load_backend
+from django.test import TestCase
+
+from .pagination import RowValueComparison
+
+
+class RowValueComparison_as_sql(TestCase):
+    def setUp(self):
+        self.date = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        self.query = get_user_model().objects.filter(
+            RowValueComparison(["date_joined", "username"], [self.date, "m"], "gt")
+        )
+
+    def test_postgresql(self):
+        sql = self.compile("django.db.backends.postgresql")
+        self.assertEqual(
+            sql, '("users_user"."date_joined", "users_user"."username") > (%s, %s)'
+        )
+
+    def test_mysql(self):
+        sql = self.compile("django.db.backends.mysql")
+        self.assertEqual(
+            sql, "(`users_user`.`date_joined`, `users_user`.`username`) > (%s, %s)"
+        )
+
+    def test_fallback(self):
+        for username in ["a", "z"]:
+            get_user_model().objects.create_user(
+                username=username,
+                email=f"{username}@example.com",
+                date_joined=self.date,
+            )
+
+        self.assertEqual([u.username for u in self.query], ["z"])
+
+    def compile(self, backend: str) -> str:
+        wrapper = load_backend(backend).DatabaseWrapper(connection.settings_dict)
+        compiler = self.query.query.get_compiler(connection=wrapper)
+        sql, params = compiler.compile(self.query.query.where)
+        self.assertEqual(len(params), 2)
+        return sql
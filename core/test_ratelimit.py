@@ -0,0 +1,159 @@
+from time import sleep
+from types import SimpleNamespace
+from typing import List
+from unittest import mock
+from unittest.case import TestCase
+from uuid import uuid4
+
+import redis
+from django.conf import settings
+from grpc_interceptor.exceptions import ResourceExhausted
+
+from .ratelimit import MemoryBackend, RateLimiter, RedisBackend, get_peer_address
+from .tests import FakeContext
+
+
+class PeerContext(FakeContext):
+    def __init__(self, peer: str):
+        super().__init__()
+        self._peer = peer
+
+    def peer(self) -> str:
+        return self._peer
+
+
+class MemoryBackend_consume(TestCase):
+    def test(self):
+        backend = MemoryBackend()
+        self.assertTrue(backend.consume("key", 2, 3600))
+        self.assertTrue(backend.consume("key", 2, 3600))
+        self.assertFalse(backend.consume("key", 2, 3600))
+        self.assertTrue(backend.consume("other", 2, 3600))
+
+    def test_refill(self):
+        backend = MemoryBackend()
+        self.assertTrue(backend.consume("key", 1, 0.01))
+        self.assertFalse(backend.consume("key", 1, 3600))
+        sleep(0.02)
+        self.assertTrue(backend.consume("key", 1, 0.01))
+
+    def test_max_size(self):
+        backend = MemoryBackend(max_size=1)
+        self.assertTrue(backend.consume("key", 1, 3600))
+        self.assertTrue(backend.consume("other", 1, 3600))
+        self.assertTrue(backend.consume("key", 1, 3600))
+
+
+class FakeScript:
+    def __init__(self, results: List):
+        self.results = results
+        self.calls = []
+
+    def __call__(self, keys: List[str], args: List) -> int:
+        self.calls.append((keys, args))
+        result = self.results.pop(0)
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+
+class FakeRedis:
+    def __init__(self, results: List):
+        self.scripts = []
+        self.results = results
+
+    def register_script(self, script: str) -> FakeScript:
+        self.scripts.append(script)
+        return FakeScript(self.results)
+
+
+class RedisBackend_consume(TestCase):
+    def test(self):
+        backend = self.make_backend([1, 0])
+        self.assertEqual(backend._client.scripts, [RedisBackend.SCRIPT])
+        self.assertTrue(backend.consume("key", 2, 3600))
+        self.assertFalse(backend.consume("key", 2, 3600))
+        self.assertEqual(
+            backend._script.calls,
+            [(["ratelimit:key"], [2, 3600])] * 2,
+        )
+
+    def test_error(self):
+        limiter = RateLimiter(MemoryBackend)
+        limiter.backend = self.make_backend([redis.ConnectionError()])
+
+        with self.assertLogs("core.ratelimit", "ERROR"):
+            self.assertTrue(limiter.consume("key", 1, 3600))
+
+    def test_server(self):
+        if not settings.RATE_LIMIT_URL:
+            self.skipTest("No redis server")
+
+        backend = RedisBackend(url=settings.RATE_LIMIT_URL)
+
+        try:
+            backend._client.ping()
+        except redis.ConnectionError:
+            self.skipTest("No redis server")
+
+        key = str(uuid4())
+        self.assertTrue(backend.consume(key, 2, 3600))
+        self.assertTrue(backend.consume(key, 2, 3600))
+        self.assertFalse(backend.consume(key, 2, 3600))
+        backend._client.delete(f"ratelimit:{key}")
+
+    def make_backend(self, results: List) -> RedisBackend:
+        with mock.patch.object(
+            redis.Redis, "from_url", return_value=FakeRedis(results)
+        ):
+            return RedisBackend(url="redis://")
+
+
+class RateLimiter_check(TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(MemoryBackend)
+        self.limits = [("peer", 3, 3600), ("identifier", 1, 3600)]
+        self.context = PeerContext("ipv4:127.0.0.1:5000")
+
+    def test_identifier(self):
+        self.check("user")
+
+        with self.assertRaises(ResourceExhausted):
+            self.check("USER ")
+
+        self.check("other")
+        self.assertEqual(self.limiter.rejected, 1)
+
+    def test_peer(self):
+        for identifier in ["a", "b", "c"]:
+            self.check(identifier)
+
+        self.context = PeerContext("ipv4:127.0.0.1:5001")
+
+        with self.assertRaises(ResourceExhausted):
+            self.check("d")
+
+    def test_caller(self):
+        limits = [("caller", 1, 3600)]
+        self.limiter.check("/Method", limits, None, self.context)
+        self.context.caller = SimpleNamespace(id="id")
+        self.limiter.check("/Method", limits, None, self.context)
+
+        with self.assertRaises(ResourceExhausted):
+            self.limiter.check("/Method", limits, None, self.context)
+
+    def check(self, identifier: str):
+        request = SimpleNamespace(identifier=identifier)
+        self.limiter.check("/Method", self.limits, request, self.context)
+
+
+class GetPeerAddress(TestCase):
+    def test(self):
+        for peer, address in [
+            ("ipv4:127.0.0.1:5000", "ipv4:127.0.0.1"),
+            ("ipv6:[::1]:5000", "ipv6:[::1]"),
+            ("unix:/tmp/socket", "unix:/tmp/socket"),
+        ]:
+            self.assertEqual(get_peer_address(PeerContext(peer)), address)
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from grpc_interceptor.exceptions import PermissionDenied
+
+from .grpc import all_servicers
+from .routes import Route, RouteService, get_routes
+from .tests import BaseTestCase
+
+
+class GetRoutes(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.routes = get_routes(list(all_servicers()))
+
+    def test_no_auth(self):
+        route = self.get_route("AccountService/Connect")
+        self.assertTrue(route.no_auth)
+        self.assertNotEqual(route.rate_limits, ())
+        self.assertFalse(route.response_streaming)
+        self.assertIsNotNone(route.deadline)
+
+    def test_auth(self):
+        route = self.get_route("UserService/RetrieveMe")
+        self.assertFalse(route.no_auth)
+
+    def test_streaming(self):
+        route = self.get_route("NotificationService/List")
+        self.assertTrue(route.request_streaming)
+        self.assertTrue(route.response_streaming)
+        self.assertIsNone(route.deadline)
+
+    def test_rpc_method(self):
+        route = self.get_route("NotificationService/WatchCount")
+        self.assertFalse(route.request_streaming)
+        self.assertTrue(route.response_streaming)
+
+    def test_query_budgets(self):
+        unbudgeted = [n for n, r in self.routes.items() if not r.query_budget]
+        self.assertEqual(unbudgeted, [])
+
+    def test_frozen(self):
+        with self.assertRaises(TypeError):
+            self.routes["/Method"] = self.get_route("AccountService/Connect")
+
+    def get_route(self, suffix: str) -> Route:
+        routes = [r for n, r in self.routes.items() if n.endswith("." + suffix)]
+        self.assertEqual(len(routes), 1)
+        return routes[0]
+
+
+class RouteService_List(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.routes = get_routes(list(all_servicers()))
+        self.service = RouteService(self.routes)
+        self.grpc_context.caller = get_user_model().objects.create_user(
+            username="main", email="main@example.com", is_staff=True
+        )
+
+    def test(self):
+        routes = self.service.List(self.request, self.grpc_context)
+        self.assertEqual(len(routes.values), len(self.routes))
+        names = [v.struct_value.fields["name"].string_value for v in routes.values]
+        self.assertEqual(names, list(self.routes))
+
+    def test_not_staff(self):
+        self.grpc_context.caller.is_staff = False
+
+        with self.assertRaises(PermissionDenied):
+            self.service.List(self.request, self.grpc_context)
@@ -0,0 +1,75 @@
+from django.core.files.images import ImageFile
+from django.test import TestCase
+
+from .models import StoredFile, TrashedFile
+from .storages import FileSystemStorage
+from .tasks import empty_trash
+from .tests import get_asset
+
+
+class FileSystemStorage_save(TestCase):
+    def setUp(self):
+        self.storage = FileSystemStorage()
+        self.names = []
+
+    def tearDown(self):
+        self.storage.delete_many(self.names)
+        empty_trash()
+
+    def test(self):
+        name = self._save("image.png")
+        self.assertRegex(name, r"^chapters/(\w\w)/(\w\w)/\1\2\w{60}\.png$")
+        self.assertTrue(self.storage.exists(name))
+
+    def test_duplicate(self):
+        name = self._save("image.png")
+        self.assertEqual(self._save("image.png"), name)
+        self.assertNotEqual(self._save("image.jpeg"), name)
+        stored_file = StoredFile.objects.get(name=self.storage.get_root_name(name))
+        self.assertEqual(stored_file.references, 2)
+
+    def test_delete(self):
+        name = self._save("image.png")
+        self._save("image.png")
+        self.storage.delete(self.names.pop())
+        self.assertFalse(TrashedFile.objects.exists())
+        self.storage.delete(self.names.pop())
+        self.assertTrue(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertEqual(empty_trash(), 1)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(TrashedFile.objects.exists())
+
+    def test_delete_restored(self):
+        name = self._save("image.png")
+        self.storage.delete(name)
+        self._save("image.png")
+        self.assertEqual(empty_trash(), 1)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_migrate(self):
+        legacy_name = "chapters/legacy.png"
+        variant_name = self.storage.get_variant_name(legacy_name, 256)
+
+        for name in [legacy_name, variant_name]:
+            with open(get_asset("image.png"), "rb") as file:
+                self.storage._save(name, ImageFile(file))
+
+        self.assertFalse(self.storage.is_sharded(variant_name))
+        new_name = self.storage.migrate(variant_name)
+        self.names.append(new_name)
+        self.assertTrue(self.storage.is_sharded(new_name))
+        self.assertRegex(new_name, r"\.256\.webp$")
+        self.assertTrue(self.storage.exists(new_name))
+        self.assertFalse(self.storage.exists(legacy_name))
+        self.assertFalse(self.storage.exists(variant_name))
+        self.assertEqual(
+            new_name, self.storage.get_variant_name(self._save("image.png"), 256)
+        )
+
+    def _save(self, asset: str) -> str:
+        with open(get_asset(asset), "rb") as file:
+            name = self.storage.save(f"chapters/{asset}", ImageFile(file))
+
+        self.names.append(name)
+        return name
@@ -1,5 +1,6 @@
+from functools import lru_cache, partial, wraps
 from os import path
-from typing import Any, Callable, Iterable, Iterator, List, Optional
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Type
 
 import grpc
 import pytest
@@ -15,6 +16,9 @@ from grpc_interceptor.exceptions import GrpcException, InvalidArgument
 from protos import image_pb2, pagination_pb2
 
 from .emails import Email
+from .grpc import all_servicers
+from .interceptors import MetricsInterceptor
+from .routes import get_routes, iterate_methods
 
 
 def get_asset(name: str) -> str:
@@ -47,7 +51,37 @@ class PytestTestRunner:
         return pytest.main(argv)
 
 
+@lru_cache()
+def get_budgeted_methods() -> List[Tuple[Type[Any], str, Callable]]:
+    services = list(all_servicers())
+    interceptor = MetricsInterceptor(get_routes(services))
+    methods = []
+
+    for name, service, member_name, *_ in iterate_methods(services):
+        if interceptor.routes[name].query_budget:
+            method = getattr(service, member_name)
+            budgeted = make_budgeted_method(interceptor, name, method)
+            methods.append((service, member_name, budgeted))
+
+    return methods
+
+
+def make_budgeted_method(
+    interceptor: MetricsInterceptor, name: str, method: Callable
+) -> Callable:
+    @wraps(method)
+    def wrapper(instance: Any, request: Any, context: grpc.ServicerContext) -> Any:
+        return interceptor.intercept(partial(method, instance), request, context, name)
+
+    return wrapper
+
+
 class BaseTestCase(TestCase):
+    @pytest.fixture(autouse=True)
+    def enforce_query_budgets(self, monkeypatch: pytest.MonkeyPatch):
+        for service, member_name, method in get_budgeted_methods():
+            monkeypatch.setattr(service, member_name, method)
+
     def setUp(self):
         self.grpc_context = FakeContext()
         self.request = empty_pb2.Empty()
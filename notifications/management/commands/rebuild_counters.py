@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.transaction import atomic
+
+from notifications.models import Counter
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--check", action="store_true")
+
+    @atomic
+    def handle(self, *args, **kwargs):
+        totals = Counter.objects.compute_totals()
+        counts = dict(Counter.objects.values_list("user_id", "count"))
+        drifted = [
+            user_id
+            for user_id in totals.keys() | counts.keys()
+            if totals.get(user_id, 0) != counts.get(user_id, 0)
+        ]
+
+        for user_id in drifted:
+            self.stdout.write(
+                f"{user_id or 'flags'}: {counts.get(user_id, 0)} "
+                f"(expected {totals.get(user_id, 0)})"
+            )
+
+        if kwargs["check"]:
+            if drifted:
+                raise CommandError(f"{len(drifted)} counter(s) drifted")
+
+            return
+
+        for user_id in drifted:
+            Counter.objects.update_or_create(
+                key=Counter.get_key(user_id),
+                defaults={"user_id": user_id, "count": totals.get(user_id, 0)},
+            )
@@ -0,0 +1,62 @@
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_counters(apps, schema_editor):
+    CountUnit = apps.get_model("notifications", "CountUnit")
+    Counter = apps.get_model("notifications", "Counter")
+    totals = (
+        CountUnit.objects.values("notification__recipient_id")
+        .annotate(total=models.Count("id"))
+        .values_list("notification__recipient_id", "total")
+    )
+    Counter.objects.bulk_create(
+        [
+            Counter(
+                user_id=user_id,
+                key=str(uuid.UUID(str(user_id))) if user_id else "flags",
+                count=total,
+            )
+            for user_id, total in totals
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("notifications", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Counter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=36, unique=True)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,26 @@
 import uuid
+from typing import Dict, Iterable, Optional, Type
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.db.models import Case, Count, OuterRef, Subquery, When
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, When
+from google.protobuf.message import Message
 
 from core.models import MessageConvertible
 from protos import notification_pb2
 
 
 def delete_notifications_for(instance: models.Model):
+    delete_notifications_for_many(type(instance), [instance.id])
+
+
+def delete_notifications_for_many(model: Type[models.Model], pk_set: Iterable):
     Notification.objects.filter(
-        target_type=ContentType.objects.get_for_model(type(instance)),
-        target_id=instance.id,
+        target_type=ContentType.objects.get_for_model(model),
+        target_id__in=[str(pk) for pk in pk_set],
     ).delete()
 
 
@@ -76,8 +82,10 @@ class Notification(models.Model, MessageConvertible):
     def get_count_query():
         return Subquery(CountUnit.objects.filter(notification_id=OuterRef("id")))
 
-    def get_message_field_values(self, **overrides) -> dict:
-        values = super().get_message_field_values(**overrides)
+    def get_message_field_values(
+        self, message_class: Type[Message], **overrides
+    ) -> dict:
+        values = super().get_message_field_values(message_class, **overrides)
         values["is_flag"] = not self.recipient
         values[self.target_type.model.lower()] = self.target.to_message()
         return values
@@ -98,3 +106,64 @@ class CountUnit(models.Model):
 
     def __str__(self) -> str:
         return f"{self.notification}: ({self.count_item_type}/{self.count_item_id})"
+
+
+class CounterManager(models.Manager):
+    def add(self, user_id: Optional[uuid.UUID], delta: int):
+        counters = self.filter(key=Counter.get_key(user_id))
+
+        if counters.update(count=F("count") + delta) or delta <= 0:
+            return
+
+        self.add_many([user_id], delta)
+
+    def add_many(self, user_ids: Iterable[Optional[uuid.UUID]], delta: int):
+        keys = {Counter.get_key(user_id): user_id for user_id in user_ids}
+
+        if delta > 0:
+            self.bulk_create(
+                [Counter(key=key, user_id=user_id) for key, user_id in keys.items()],
+                ignore_conflicts=True,
+            )
+
+        self.filter(key__in=keys).update(count=F("count") + delta)
+
+    def get_total(self, user: AbstractUser) -> int:
+        filters = Q(user=user)
+
+        if user.is_staff:
+            filters |= Q(user__isnull=True)
+
+        return self.filter(filters).aggregate(total=Sum("count"))["total"] or 0
+
+    def compute_totals(self) -> Dict[Optional[uuid.UUID], int]:
+        return dict(
+            CountUnit.objects.values("notification__recipient_id")
+            .annotate(total=Count("id"))
+            .values_list("notification__recipient_id", "total")
+        )
+
+
+class Counter(models.Model):
+    objects = CounterManager()
+    channel_prefix = "notifications.count."
+
+    user = models.OneToOneField(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+    )
+    key = models.CharField(max_length=len(str(uuid.uuid4())), unique=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.user}: {self.count}"
+
+    @classmethod
+    def get_key(cls, user_id: Optional[uuid.UUID]) -> str:
+        return str(uuid.UUID(str(user_id))) if user_id else "flags"
+
+    @classmethod
+    def get_channel(cls, user_id: Optional[uuid.UUID]) -> str:
+        return cls.channel_prefix + (str(user_id) if user_id else "flags")
@@ -1,29 +1,50 @@
 from typing import Iterator
 
 import grpc
-from django.db.models import Case, Count, OuterRef, Subquery, Sum, When
+from django.db.models import Case, Count, OuterRef, Subquery, When
 from google.protobuf import empty_pb2
 
+from core.authentication import query_budget
 from core.pagination import PaginatorMixin
+from core.pubsub import SubscriptionStream, hub
+from core.services import rpc_method
 from protos import notification_pb2, notification_pb2_grpc, pagination_pb2
 
-from .models import CountUnit, Notification
+from .models import Counter, CountUnit, Notification
 from .pagination import NotificationPaginationAdapter
 
 
 class NotificationService(
     PaginatorMixin, notification_pb2_grpc.NotificationServiceServicer
 ):
+    @query_budget(per_call=2)
     def Count(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> notification_pb2.NotificationCount:
-        count = (
-            Notification.objects.filter_readable_by(context.caller)
-            .aggregate(total_count=Sum("count"))
-            .get("total_count")
-        )
+        count = Counter.objects.get_total(context.caller)
         return notification_pb2.NotificationCount(count=count)
 
+    @rpc_method(
+        request_class=empty_pb2.Empty,
+        response_class=notification_pb2.NotificationCount,
+        response_streaming=True,
+    )
+    @query_budget(per_message=2)
+    def WatchCount(
+        self, request: empty_pb2.Empty, context: grpc.ServicerContext
+    ) -> Iterator[notification_pb2.NotificationCount]:
+        channels = [Counter.get_channel(context.caller.id)]
+
+        if context.caller.is_staff:
+            channels.append(Counter.get_channel(None))
+
+        stream = SubscriptionStream(
+            hub.subscribe(*channels), lambda: self.Count(request, context)
+        )
+        context.add_callback(stream.close)
+        return stream
+
+    @query_budget(per_message=4)
     def List(
         self,
         request_iterator: Iterator[pagination_pb2.Page],
@@ -37,6 +58,7 @@ class NotificationService(
             adapter=NotificationPaginationAdapter(),
         )
 
+    @query_budget(per_call=50)
     def Clear(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
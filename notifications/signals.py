@@ -1,15 +1,25 @@
+from typing import Optional, Type
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.db.models import Model
 from django.db.models.signals import post_delete, post_save
+from django.db.transaction import on_commit
 from django.dispatch import receiver
 
-from core.signals import post_soft_delete
+from core.pubsub import hub
+from core.signals import post_bulk_soft_delete, post_soft_delete
 from posts.models import Comment
 from posts.signals import fetched
 from users.signals import post_ban
 
-from .models import CountUnit, Notification, delete_notifications_for
+from .models import (
+    Counter,
+    CountUnit,
+    Notification,
+    delete_notifications_for,
+    delete_notifications_for_many,
+)
 from .tasks import send_notifications, remove_comments_from_notifications
 
 
@@ -18,6 +28,11 @@ def on_post_soft_delete(instance: Model, **kwargs):
     delete_notifications_for(instance)
 
 
+@receiver(post_bulk_soft_delete)
+def on_post_bulk_soft_delete(sender: Type[Model], pk_set: list, **kwargs):
+    delete_notifications_for_many(sender, pk_set)
+
+
 @receiver(post_ban, sender=get_user_model())
 def on_user_post_ban(instance: AbstractUser, **kwargs):
     delete_notifications_for(instance)
@@ -37,14 +52,30 @@ def on_comment_fetched(user: AbstractUser, pk_set: list, **kwargs):
 
 
 @receiver(post_save, sender=CountUnit)
-def on_count_unit_post_save(instance: CountUnit, **kwargs):
+def on_count_unit_post_save(instance: CountUnit, created: bool, **kwargs):
     instance.notification.save()
 
+    if created:
+        update_counter(instance.notification.recipient_id, 1)
+
 
 @receiver(post_delete, sender=CountUnit)
 def on_count_unit_post_delete(instance: CountUnit, **kwargs):
+    try:
+        notification = instance.notification
+    except Notification.DoesNotExist:
+        return
+
+    update_counter(notification.recipient_id, -1)
+
     if CountUnit.objects.filter(notification_id=instance.notification_id).count() == 0:
         try:
-            instance.notification.delete()
+            notification.delete()
         except Notification.DoesNotExist:
             pass
+
+
+def update_counter(user_id: Optional[int], delta: int):
+    Counter.objects.add(user_id, delta)
+    channel = Counter.get_channel(user_id)
+    on_commit(lambda: hub.publish(channel))
@@ -1,30 +1,86 @@
 from typing import List
 
 from celery import shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
-from django.db.transaction import atomic
+from django.db.transaction import atomic, on_commit
+from django.utils.timezone import now
 
-from posts.models import Comment, Post
+from core.pubsub import hub
+from posts.models import Comment, Post, Subscription
 
-from .models import CountUnit, Notification
+from .models import Counter, CountUnit, Notification
 
 
 @shared_task
 def send_notifications(comment_id: str):
-    comment = Comment.objects.select_related().get(id=comment_id)
+    comment = Comment.objects.get(id=comment_id)
+    post_type = ContentType.objects.get_for_model(Post)
+    comment_type = ContentType.objects.get_for_model(Comment)
+    user_ids = list(
+        Subscription.objects.filter(post_id=comment.post_id)
+        .exclude(user_id=comment.author_id)
+        .values_list("user_id", flat=True)
+    )
+    chunk_size = settings.NOTIFICATIONS_FAN_OUT_CHUNK_SIZE
 
-    for user_id in comment.post.subscribers.exclude(id=comment.author_id).values_list(
-        "id", flat=True
-    ):
+    for i in range(0, len(user_ids), chunk_size):
         with atomic():
-            notification, _ = Notification.objects.get_or_create(
-                recipient_id=user_id,
-                target_type=ContentType.objects.get_for_model(Post),
-                target_id=comment.post_id,
+            send_notifications_chunk(
+                comment, user_ids[i : i + chunk_size], post_type, comment_type
+            )
+
+
+def send_notifications_chunk(
+    comment: Comment,
+    user_ids: List[str],
+    post_type: ContentType,
+    comment_type: ContentType,
+):
+    target_id = str(comment.post_id)
+    Notification.objects.bulk_create(
+        [
+            Notification(recipient_id=u, target_type=post_type, target_id=target_id)
+            for u in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+    notifications = Notification._base_manager.filter(
+        recipient_id__in=user_ids, target_type=post_type, target_id=target_id
+    )
+    notification_ids = dict(
+        notifications.select_for_update()
+        .order_by("id")
+        .values_list("id", "recipient_id")
+    )
+    existing_ids = set(
+        CountUnit.objects.filter(
+            notification_id__in=notification_ids,
+            count_item_type=comment_type,
+            count_item_id=str(comment.id),
+        ).values_list("notification_id", flat=True)
+    )
+    new_ids = [i for i in notification_ids if i not in existing_ids]
+    CountUnit.objects.bulk_create(
+        [
+            CountUnit(
+                notification_id=i,
+                count_item_type=comment_type,
+                count_item_id=str(comment.id),
             )
+            for i in new_ids
+        ]
+    )
+    notifications.update(date_updated=now())
+    recipient_ids = [notification_ids[i] for i in new_ids]
+    Counter.objects.add_many(recipient_ids, 1)
+
+    def publish():
+        for user_id in recipient_ids:
+            hub.publish(Counter.get_channel(user_id))
 
-            CountUnit.objects.create(notification=notification, count_item=comment)
+    on_commit(publish)
 
 
 @shared_task
@@ -1,7 +1,12 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
 from posts.models import Comment
 from posts.tests import BaseCommentTestCase, PublishedPostTestCase
 
-from .models import CountUnit, Notification
+from .models import Counter, CountUnit, Notification
 
 
 class Comment_create(PublishedPostTestCase):
@@ -18,6 +23,7 @@ class Comment_create(PublishedPostTestCase):
         self.assertEqual(notification.target, self.post)
         self.assertEqual(notification.count, 1)
         self.assertEqual(CountUnit.objects.first().count_item, comment)
+        self.assertEqual(Counter.objects.get_total(self.main_user), 1)
 
     def test_same_author(self):
         Comment.objects.create(post=self.post, author=self.main_user, text="Text")
@@ -33,3 +39,32 @@ class Notification_delete(BaseCommentTestCase):
         self.assertEqual(
             Notification.objects.filter(recipient=self.main_user).count(), 0
         )
+        self.assertEqual(Counter.objects.get_total(self.main_user), 0)
+
+
+class Counter_add(BaseCommentTestCase):
+    def test_flags(self):
+        Counter.objects.add(None, 1)
+        Counter.objects.add_many([None, self.other_user.id], 2)
+        self.assertEqual(Counter.objects.filter(user__isnull=True).count(), 1)
+        self.assertEqual(Counter.objects.get(key="flags").count, 3)
+        self.assertEqual(Counter.objects.get_total(self.other_user), 2)
+
+    def test_many(self):
+        Counter.objects.add_many([self.main_user.id, self.other_user.id], 1)
+        self.assertEqual(Counter.objects.get_total(self.main_user), 2)
+        self.assertEqual(Counter.objects.get_total(self.other_user), 1)
+
+
+class Counter_rebuild(BaseCommentTestCase):
+    def test(self):
+        stdout = StringIO()
+        call_command("rebuild_counters", check=True, stdout=stdout)
+        Counter.objects.filter(user=self.main_user).update(count=5)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_counters", check=True, stdout=stdout)
+
+        call_command("rebuild_counters", stdout=stdout)
+        self.assertEqual(Counter.objects.get_total(self.main_user), 1)
+        call_command("rebuild_counters", check=True, stdout=stdout)
@@ -2,13 +2,14 @@ from typing import Iterator, List
 
 from django.utils.timezone import now
 
+from core.pubsub import hub
 from core.tests import PaginationTestCase
 from notifications.pagination import NotificationPaginationAdapter
 from posts.models import Comment
 from posts.test_services import CommentServiceTestCase, PostServiceTestCase
 from protos import notification_pb2, pagination_pb2
 
-from .models import CountUnit, Notification
+from .models import Counter, CountUnit, Notification
 from .services import NotificationService
 
 
@@ -72,6 +73,42 @@ class NotificationService_Count(NotificationServiceTestCase):
         self.assertEqual(count.count, 0)
 
 
+class NotificationService_WatchCount(NotificationServiceTestCase):
+    def test(self):
+        stream = self.service.WatchCount(self.request, self.grpc_context)
+        self.assertEqual(next(stream).count, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                author=self.other_user, post=self.main_posts[0], text="Text"
+            )
+
+        self.assertEqual(next(stream).count, 1)
+        stream.close()
+        self.assertEqual(list(stream), [])
+
+    def test_multiplexed(self):
+        channel = Counter.get_channel(self.main_user.id)
+        streams = [
+            self.service.WatchCount(self.request, self.grpc_context) for _ in range(3)
+        ]
+        self.assertEqual(hub.get_subscription_count(channel), 3)
+
+        for stream in streams:
+            next(stream)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                author=self.other_user, post=self.main_posts[0], text="Text"
+            )
+
+        for stream in streams:
+            self.assertEqual(next(stream).count, 1)
+            stream.close()
+
+        self.assertEqual(hub.get_subscription_count(channel), 0)
+
+
 class NotificationService_List(NotificationServiceTestCase, PaginationTestCase):
     date_field = "date_updated"
 
@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AbstractUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Comment, Post, Subscription
+from posts.tests import PublishedPostTestCase
+from users.tests import make_email
+
+from .models import Counter, CountUnit, Notification
+from .tasks import send_notifications
+
+
+class Task_send_notifications(PublishedPostTestCase):
+    def test(self):
+        subscribers = self._create_subscribers(5)
+        self._send_notifications()
+
+        for user in subscribers:
+            notification = Notification.objects.get(recipient=user)
+            self.assertEqual(notification.target, self.post)
+            self.assertEqual(notification.count, 1)
+            self.assertEqual(Counter.objects.get_total(user), 1)
+
+        self.assertEqual(Counter.objects.get_total(self.other_user), 0)
+
+    def test_twice(self):
+        subscribers = self._create_subscribers(3)
+        comment = self._send_notifications()
+        send_notifications.delay(comment_id=str(comment.id))
+
+        for user in subscribers:
+            self.assertEqual(Notification.objects.get(recipient=user).count, 1)
+            self.assertEqual(Counter.objects.get_total(user), 1)
+
+    def test_existing_unit(self):
+        subscribers = self._create_subscribers(2)
+        (comment,) = Comment.objects.bulk_create(
+            [Comment(post=self.post, author=self.other_user, text="Text")]
+        )
+        notification = Notification.objects.create(
+            recipient=subscribers[0], target=self.post
+        )
+        CountUnit.objects.bulk_create(
+            [CountUnit(notification=notification, count_item=comment)]
+        )
+        send_notifications.delay(comment_id=str(comment.id))
+        self.assertEqual(Counter.objects.get_total(subscribers[0]), 0)
+        self.assertEqual(Counter.objects.get_total(subscribers[1]), 1)
+
+    @override_settings(NOTIFICATIONS_FAN_OUT_CHUNK_SIZE=2)
+    def test_chunks(self):
+        subscribers = self._create_subscribers(5)
+        self._send_notifications()
+        self.assertEqual(
+            CountUnit.objects.filter(notification__recipient__in=subscribers).count(),
+            len(subscribers),
+        )
+
+    def test_query_count(self):
+        query_counts = []
+        ContentType.objects.get_for_model(Post)
+        ContentType.objects.get_for_model(Comment)
+
+        for count, offset in [(2, 0), (20, 2)]:
+            post = Post.objects.create(author=self.main_user)
+            self._create_subscribers(count, offset, post=post)
+
+            with CaptureQueriesContext(connection) as queries:
+                self._send_notifications(post=post, author=self.main_user)
+
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def _create_subscribers(
+        self, count: int, offset: int = 0, post: Optional[Post] = None
+    ) -> List:
+        users = get_user_model().objects.bulk_create(
+            [
+                get_user_model()(
+                    username=f"subscriber{i}", email=make_email(f"subscriber{i}")
+                )
+                for i in range(offset, offset + count)
+            ]
+        )
+        Subscription.objects.bulk_create(
+            [Subscription(user=user, post=post or self.post) for user in users]
+        )
+        return users
+
+    def _send_notifications(
+        self, post: Optional[Post] = None, author: Optional[AbstractUser] = None
+    ) -> Comment:
+        (comment,) = Comment.objects.bulk_create(
+            [
+                Comment(
+                    post=post or self.post,
+                    author=author or self.other_user,
+                    text="Text",
+                )
+            ]
+        )
+        send_notifications.delay(comment_id=str(comment.id))
+        return comment
@@ -0,0 +1,273 @@
+import threading
+from bisect import insort
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Any, Callable, Collection, Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Exists, OuterRef
+from django.db.transaction import atomic
+from django.utils.timezone import now
+
+from core.aio import RequestStream
+
+from .models import ActivePostManager, Post, Stack, Vote
+
+Candidate = Tuple[datetime, Any, Any]
+
+
+class CandidatePool:
+    def __init__(
+        self,
+        load: Callable[[], Iterable[Candidate]],
+        lifetime: timedelta,
+        timeout: float,
+    ):
+        self.lifetime = lifetime
+        self.timeout = timeout
+        self._load = load
+        self._candidates = []
+        self._ids = {}
+        self._deadline = 0
+        self._changes = None
+        self._lock = threading.Lock()
+
+    def add(self, date_published: datetime, post_id: Any, author_id: Any):
+        self._apply(self._add, (date_published, str(post_id), author_id))
+
+    def remove(self, post_id: Any):
+        self._apply(self._remove, str(post_id))
+
+    def clear(self):
+        with self._lock:
+            self._candidates = []
+            self._ids = {}
+            self._deadline = 0
+
+    def reload(self):
+        with self._lock:
+            if self._changes is not None:
+                return
+
+            self._changes = []
+
+        try:
+            candidates = sorted((d, str(p), a) for d, p, a in self._load())
+        except Exception:
+            with self._lock:
+                self._changes = None
+
+            raise
+
+        with self._lock:
+            self._candidates = candidates
+            self._ids = {c[1]: c for c in candidates}
+            self._deadline = monotonic() + self.timeout
+
+            for change, argument in self._changes:
+                change(argument)
+
+            self._changes = None
+
+    def iterate(self, excluded_author_ids: Collection[Any]) -> Iterator[str]:
+        if self._deadline <= monotonic():
+            self.reload()
+
+        with self._lock:
+            limit = now() - self.lifetime
+            expired = 0
+
+            for candidate in self._candidates:
+                if candidate[0] >= limit:
+                    break
+
+                expired += 1
+
+            for candidate in self._candidates[:expired]:
+                del self._ids[candidate[1]]
+
+            del self._candidates[:expired]
+            candidates = list(self._candidates)
+
+        for _, post_id, author_id in candidates:
+            if author_id not in excluded_author_ids:
+                yield post_id
+
+    def _apply(self, change: Callable[[Any], None], argument: Any):
+        with self._lock:
+            change(argument)
+
+            if self._changes is not None:
+                self._changes.append((change, argument))
+
+    def _add(self, candidate: Candidate):
+        self._remove(candidate[1])
+        insort(self._candidates, candidate)
+        self._ids[candidate[1]] = candidate
+
+    def _remove(self, post_id: str):
+        if candidate := self._ids.pop(post_id, None):
+            self._candidates.remove(candidate)
+
+
+def select_posts(
+    pool: CandidatePool,
+    user_id: Any,
+    excluded_author_ids: Collection[Any],
+    count: int,
+) -> List[str]:
+    selected = []
+    batch = []
+    batch_size = max(count * 4, settings.FEED_CANDIDATE_BATCH_SIZE)
+
+    voted_ids = set(
+        str(i)
+        for i in Vote.objects.filter(
+            user_id=user_id, post__date_published__gte=now() - pool.lifetime
+        ).values_list("post_id", flat=True)
+    )
+
+    def process_batch():
+        active_ids = set(
+            str(i)
+            for i in Post.active_objects.filter(id__in=batch).values_list(
+                "id", flat=True
+            )
+        )
+        selected.extend(i for i in batch if i in active_ids)
+        batch.clear()
+
+    for post_id in pool.iterate(excluded_author_ids):
+        if post_id in voted_ids:
+            continue
+
+        batch.append(post_id)
+
+        if len(batch) >= batch_size:
+            process_batch()
+
+            if len(selected) >= count:
+                break
+
+    if batch and len(selected) < count:
+        process_batch()
+
+    return selected[:count]
+
+
+class VoteBuffer:
+    def __init__(self, stack: Stack, size: int, window: float):
+        self.stack = stack
+        self.size = size
+        self.window = window
+        self._votes = {}
+        self._deadline = 0
+
+    @property
+    def is_due(self) -> bool:
+        return len(self._votes) >= self.size or (
+            len(self._votes) > 0 and self._deadline <= monotonic()
+        )
+
+    def add(self, post_id: str, spread: bool):
+        if post_id in self._votes:
+            raise IntegrityError
+
+        voted = Vote.objects.filter(user_id=self.stack.user_id, post=OuterRef("pk"))
+        posts = (
+            Post.objects.filter(id=post_id)
+            .annotate(is_voted=Exists(voted))
+            .values_list("author_id", "is_voted")
+        )
+
+        if not posts:
+            raise Post.DoesNotExist
+
+        author_id, is_voted = posts[0]
+
+        if is_voted or author_id == self.stack.user_id:
+            raise IntegrityError
+
+        if not self._votes:
+            self._deadline = monotonic() + self.window
+
+        self._votes[post_id] = spread
+
+    def flush(self):
+        if not self._votes:
+            return
+
+        # The batch is only dropped once it is committed, so a failed flush
+        # can be retried.
+        with atomic():
+            Vote.objects.cast(
+                [
+                    Vote(user_id=self.stack.user_id, post_id=post_id, spread=spread)
+                    for post_id, spread in self._votes.items()
+                ]
+            )
+
+        self._votes = {}
+
+
+class FeedStream(RequestStream):
+    def __init__(self, requests: Iterable, user: Any):
+        super().__init__(requests)
+        self.user = user
+        self.stack = None
+        self.posts = []
+        self.votes = None
+        self.end_reached = False
+
+    def refill(self):
+        self.stack.fill()
+        new_posts = list(self.stack.posts.order_by("date_published").select_related())
+        current_ids = [str(p.id) for p in self.posts]
+
+        for post in new_posts:
+            if str(post.id) not in current_ids:
+                self.posts.append(post)
+
+    def start(self) -> Iterable:
+        self.stack = Stack.objects.get(user=self.user)
+        self.refill()
+        self.is_finished = len(self.posts) == 0
+        self.votes = VoteBuffer(
+            self.stack,
+            size=settings.FEED_VOTE_BATCH_SIZE,
+            window=settings.FEED_VOTE_BATCH_WINDOW,
+        )
+        return [p.to_message() for p in self.posts[:3]]
+
+    def handle(self, request: Any) -> Iterable:
+        self.votes.add(request.post_id, request.spread)
+        self.posts = [p for p in self.posts if str(p.id) != request.post_id]
+        responses = []
+
+        if len(self.posts) >= 3:
+            if self.votes.is_due:
+                self.votes.flush()
+
+            responses.append(self.posts[2].to_message())
+        elif not self.end_reached:
+            self.votes.flush()
+            self.refill()
+            responses.append(self.posts[-1 if len(self.posts) < 3 else 2].to_message())
+
+            if len(self.posts) < Stack.MAX_SIZE:
+                self.end_reached = True
+
+        self.is_finished = len(self.posts) == 0
+        return responses
+
+    def finish(self):
+        if self.votes is not None:
+            self.votes.flush()
+
+
+candidate_pool = CandidatePool(
+    load=lambda: Post.active_objects.values_list("date_published", "id", "author_id"),
+    lifetime=ActivePostManager.lifetime,
+    timeout=settings.FEED_POOL_TIMEOUT,
+)
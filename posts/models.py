@@ -1,20 +1,23 @@
+from collections import defaultdict
 from datetime import timedelta
 from math import ceil
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Type
 
 from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.core.validators import MaxLengthValidator, MinValueValidator
 from django.db import IntegrityError, models
-from django.db.models.functions import Replace
+from django.db.models.functions import Greatest, Replace
 from django.db.transaction import atomic
 from django.utils.timezone import now
+from google.protobuf.message import Message
 from grpc_interceptor.exceptions import InvalidArgument, PermissionDenied
 
 from core.models import (
     ExistingManager,
     MessageConvertible,
     SoftDeleteModel,
+    SoftDeleteQuerySet,
     TimestampModel,
     UUIDModel,
 )
@@ -50,7 +53,7 @@ class ValidatableModel(models.Model, MessageConvertible):
         raise NotImplementedError
 
 
-class PostQuerySet(models.QuerySet):
+class PostQuerySet(SoftDeleteQuerySet):
     def get_readable_by(self, author: AbstractBaseUser, *args, **kwargs) -> "Post":
         return self.get(
             models.Q(author=author) | models.Q(date_published__isnull=False),
@@ -78,6 +81,26 @@ class PostQuerySet(models.QuerySet):
 
         return post
 
+    def add_life(self, deltas: Mapping[Any, int]) -> int:
+        groups = defaultdict(list)
+
+        for post_id, delta in deltas.items():
+            if delta:
+                groups[delta].append(post_id)
+
+        if not groups:
+            return 0
+
+        increase = models.Case(
+            *[models.When(id__in=ids, then=delta) for delta, ids in groups.items()],
+            output_field=models.IntegerField(),
+        )
+        gaining_ids = [i for d, ids in groups.items() if d > 0 for i in ids]
+        losing_ids = [i for d, ids in groups.items() if d < 0 for i in ids]
+        return self.filter(
+            models.Q(id__in=gaining_ids) | models.Q(id__in=losing_ids, life__gt=0)
+        ).update(life=Greatest(models.F("life") + increase, 0))
+
 
 class ExistingPostManager(models.Manager):
     def get_queryset(self) -> PostQuerySet:
@@ -109,17 +132,28 @@ class DraftPostManager(ExistingPostManager):
 
 
 class ActivePostManager(ExistingPostManager):
+    lifetime = timedelta(weeks=4)
+
     def get_queryset(self) -> models.QuerySet:
-        deadline = now() - timedelta(weeks=4)
+        deadline = now() - self.lifetime
         return super().get_queryset().filter(date_published__gte=deadline, life__gt=0)
 
 
 class Post(UUIDModel, TimestampModel, SoftDeleteModel, ValidatableModel):
     class Meta:
         ordering = ["date_published", "id"]
+        indexes = [
+            models.Index(
+                fields=["date_published", "id"], name="post_date_published_id_idx"
+            ),
+            models.Index(
+                fields=["date_created", "id"], name="post_date_created_id_idx"
+            ),
+        ]
 
     MAX_CHAPTERS = 10
-    objects = models.Manager()
+    soft_delete_values = {"life": 0}
+    objects = PostQuerySet.as_manager()
     existing_objects = ExistingPostManager()
     published_objects = PublishedPostManager()
     draft_objects = DraftPostManager()
@@ -146,14 +180,18 @@ class Post(UUIDModel, TimestampModel, SoftDeleteModel, ValidatableModel):
     def __str__(self) -> str:
         return f"{self.author}: {self.chapters.count()} ({self.date_published or self.date_created})"
 
-    def get_message_field_values(self, **overrides) -> dict:
-        data = super().get_message_field_values(**overrides)
+    def get_message_field_values(
+        self, message_class: Type[Message], **overrides
+    ) -> dict:
+        data = super().get_message_field_values(message_class, **overrides)
         chapters = data["chapters"].all()
 
         if overrides.get("is_preview", False):
             chapters = chapters[:1]
 
-        data["chapters"] = [self.convert_value("chapters", c) for c in chapters]
+        data["chapters"] = [
+            self.convert_value(message_class, "chapters", c) for c in chapters
+        ]
         return data
 
     def delete(self, *args, **kwargs) -> Tuple[int, Dict[str, int]]:
@@ -163,10 +201,6 @@ class Post(UUIDModel, TimestampModel, SoftDeleteModel, ValidatableModel):
             else self.soft_delete()
         )
 
-    def perform_soft_delete(self):
-        self.life = 0
-        super().perform_soft_delete()
-
     def publish(self, anonymous: bool):
         if self.date_published is not None:
             raise IntegrityError(self.error_already_published)
@@ -258,8 +292,10 @@ class Chapter(ValidatableModel):
     def __str__(self) -> str:
         return f"{self.post}: {self.position}"
 
-    def get_message_field_values(self, **options) -> dict:
-        data = super().get_message_field_values(**options)
+    def get_message_field_values(
+        self, message_class: Type[Message], **overrides
+    ) -> dict:
+        data = super().get_message_field_values(message_class, **overrides)
 
         if data["image"]:
             data["image"].width = self.width
@@ -299,31 +335,70 @@ class Stack(models.Model):
         if posts_count >= self.MAX_SIZE:
             return
 
-        post_ids = (
-            Post.active_objects.exclude(
-                models.Q(author=self.user)
-                | models.Q(author__in=self.user.blocked_users.values("id"))
-                | models.Q(voters=self.user)
-            )
-            .order_by("date_published")
-            .values_list("id", flat=True)[: self.MAX_SIZE]
+        from .feed import candidate_pool, select_posts
+
+        excluded_author_ids = set(self.user.blocked_users.values_list("id", flat=True))
+        excluded_author_ids.add(self.user_id)
+        post_ids = select_posts(
+            candidate_pool, self.user_id, excluded_author_ids, self.MAX_SIZE
         )
-        current_post_ids = list(self.posts.values_list("id", flat=True))
+        current_post_ids = set(str(i) for i in self.posts.values_list("id", flat=True))
         self.posts.set(post_ids)
-        self.posts.exclude(id__in=current_post_ids).update(life=models.F("life") - 1)
+        Post.objects.add_life({i: -1 for i in post_ids if i not in current_post_ids})
         self.save()
 
     @atomic
     def drain(self):
-        self.posts.update(life=models.F("life") + 1)
+        Post.objects.add_life({i: 1 for i in self.posts.values_list("id", flat=True)})
         self.posts.clear()
 
 
+class VoteQuerySet(models.QuerySet):
+    @atomic
+    def cast(self, votes: Iterable["Vote"]) -> List["Vote"]:
+        votes = list(votes)
+        own_votes = models.Q()
+
+        for vote in votes:
+            own_votes |= models.Q(id=vote.post_id, author_id=vote.user_id)
+
+        if votes and Post.objects.filter(own_votes).exists():
+            raise IntegrityError
+
+        votes = self.bulk_create(votes)
+        self.apply(votes)
+        return votes
+
+    def apply(self, votes: Iterable["Vote"]):
+        deltas = defaultdict(int)
+        post_ids_by_user = defaultdict(list)
+
+        for vote in votes:
+            if vote.spread:
+                deltas[vote.post_id] += Vote.SPREAD_LIFE
+
+            post_ids_by_user[vote.user_id].append(vote.post_id)
+
+        Post.objects.add_life(deltas)
+
+        if post_ids_by_user:
+            condition = models.Q()
+
+            for user_id, post_ids in post_ids_by_user.items():
+                condition |= models.Q(stack__user_id=user_id, post_id__in=post_ids)
+
+            Visibility.objects.filter(condition).delete()
+
+
 class Vote(models.Model):
     class Meta:
         unique_together = ["user", "post"]
         ordering = unique_together
 
+    SPREAD_LIFE = 4
+
+    objects = VoteQuerySet.as_manager()
+
     user = models.ForeignKey(
         to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
     )
@@ -349,8 +424,14 @@ class Visibility(models.Model):
 class Comment(UUIDModel, TimestampModel, SoftDeleteModel):
     class Meta:
         ordering = ["date_created", "id"]
-
-    objects = models.Manager()
+        indexes = [
+            models.Index(
+                fields=["date_created", "id"], name="comment_date_created_id_idx"
+            ),
+        ]
+
+    soft_delete_values = {"text": ""}
+    objects = SoftDeleteQuerySet.as_manager()
     existing_objects = ExistingManager()
     default_message_class = comment_pb2.Comment
 
@@ -365,8 +446,10 @@ class Comment(UUIDModel, TimestampModel, SoftDeleteModel):
     def __str__(self) -> str:
         return f"{self.author}, {self.post} ({self.date_created})"
 
-    def get_message_field_values(self, **overrides) -> dict:
-        values = super().get_message_field_values(**overrides)
+    def get_message_field_values(
+        self, message_class: Type[Message], **overrides
+    ) -> dict:
+        values = super().get_message_field_values(message_class, **overrides)
 
         if self.is_deleted:
             del values["text"]
@@ -376,10 +459,6 @@ class Comment(UUIDModel, TimestampModel, SoftDeleteModel):
     def delete(self, *args, **kwargs) -> Tuple[int, Dict[str, int]]:
         return self.soft_delete()
 
-    def perform_soft_delete(self):
-        self.text = ""
-        super().perform_soft_delete()
-
 
 class Subscription(models.Model):
     class Meta:
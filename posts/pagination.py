@@ -1,6 +1,14 @@
-from typing import Iterable
+from typing import Iterable, Iterator, List
 
-from core.pagination import PaginationAdapter
+from django.db.models import OuterRef, Prefetch, QuerySet, Subquery
+from google.protobuf.message import Message
+from grpc_interceptor.exceptions import InvalidArgument
+
+from core.pagination import Pagination, PaginationAdapter
+from protos import comment_pb2, pagination_pb2
+
+from .models import Chapter, Comment, Post
+from .signals import fetched
 
 
 class CreationDatePaginationAdapter(PaginationAdapter):
@@ -11,3 +19,70 @@ class CreationDatePaginationAdapter(PaginationAdapter):
 class PublicationDatePaginationAdapter(PaginationAdapter):
     def get_cursor_fields(self) -> Iterable[str]:
         return ["date_published", "id"]
+
+
+class PostPreviewPrefetchMixin:
+    def prefetch_queryset(self, query: QuerySet) -> QuerySet:
+        first_positions = (
+            Chapter.objects.filter(post=OuterRef("post"))
+            .order_by("position")
+            .values("position")[:1]
+        )
+        first_chapters = Chapter.objects.filter(position=Subquery(first_positions))
+        return query.select_related("author").prefetch_related(
+            Prefetch("chapters", queryset=first_chapters)
+        )
+
+
+class DraftPreviewPaginationAdapter(
+    PostPreviewPrefetchMixin, CreationDatePaginationAdapter
+):
+    pass
+
+
+class PostPreviewPaginationAdapter(
+    PostPreviewPrefetchMixin, PublicationDatePaginationAdapter
+):
+    pass
+
+
+class CommentPaginationAdapter(CreationDatePaginationAdapter):
+    def prefetch_queryset(self, query: QuerySet) -> QuerySet:
+        return query.select_related("author")
+
+
+class CommentPagination(Pagination):
+    def __init__(self, request_iterator: Iterable[pagination_pb2.Page], user):
+        super().__init__(
+            request_iterator,
+            None,
+            bundle_class=comment_pb2.Comments,
+            adapter=CommentPaginationAdapter(),
+            on_items=self.mark_seen,
+        )
+        self.user = user
+        self.post = None
+
+    def handle(self, request: pagination_pb2.Page) -> Iterator[Message]:
+        if self.post is None:
+            self.post = Post.existing_objects.get_published_readable_by(
+                self.user, id=request.context_id
+            )
+            self.set_query(self.post.comments.all())
+            return iter(())
+
+        return super().handle(request)
+
+    def end(self) -> Iterable[Message]:
+        if self.post is None:
+            raise InvalidArgument("missing_context_id")
+
+        return ()
+
+    def mark_seen(self, comments: List[Comment]):
+        comments = sorted(comments, key=lambda c: c.date_created)
+        self.post.subscriptions.filter(user=self.user).update(
+            last_comment_seen=comments[-1]
+        )
+        pk_set = set(c.id for c in comments)
+        fetched.send(sender=Comment, user=self.user, pk_set=pk_set)
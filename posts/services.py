@@ -1,10 +1,11 @@
-from typing import Iterator, List
+from typing import Iterator
 
 import grpc
 from django.contrib.contenttypes.models import ContentType
 from google.protobuf import empty_pb2, timestamp_pb2
 from grpc_interceptor.exceptions import InvalidArgument, PermissionDenied
 
+from core.authentication import query_budget
 from core.pagination import PaginatorMixin
 from core.services import ImageUploadMixin
 from notifications.models import Notification, delete_notifications_for
@@ -18,53 +19,23 @@ from protos import (
     post_pb2_grpc,
 )
 
-from .models import Chapter, Comment, Post, Stack, Vote
-from .pagination import CreationDatePaginationAdapter, PublicationDatePaginationAdapter
-from .signals import fetched
+from .feed import FeedStream
+from .models import Chapter, Comment, Post
+from .pagination import (
+    CommentPagination,
+    DraftPreviewPaginationAdapter,
+    PostPreviewPaginationAdapter,
+)
 
 
 class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
+    @query_budget(per_message=40)
     def ListFeed(
         self, request_iterator: Iterator[post_pb2.Vote], context: grpc.ServicerContext
     ) -> Iterator[post_pb2.Post]:
-        stack = Stack.objects.get(user=context.caller)
-        posts = []
-        end_reached = False
-
-        def refill_stack():
-            nonlocal posts
-            stack.fill()
-            new_posts = list(stack.posts.order_by("date_published").select_related())
-            current_ids = [str(p.id) for p in posts]
-
-            for post in new_posts:
-                if str(post.id) not in current_ids:
-                    posts.append(post)
-
-        refill_stack()
-        yield from [p.to_message() for p in posts[:3]]
-
-        while len(posts) > 0:
-            request = next(request_iterator)
-            Vote.objects.create(
-                user=context.caller,
-                post_id=request.post_id,
-                spread=request.spread,
-            )
-
-            posts = [p for p in posts if str(p.id) != request.post_id]
-            post_count = len(posts)
-            should_refill = post_count < 3
-
-            if not should_refill:
-                yield posts[2].to_message()
-            elif not end_reached:
-                refill_stack()
-                yield posts[-1 if len(posts) < 3 else 2].to_message()
-
-                if len(posts) < Stack.MAX_SIZE:
-                    end_reached = True
+        return FeedStream(request_iterator, context.caller)
 
+    @query_budget(per_message=4)
     def ListArchive(
         self,
         request_iterator: Iterator[pagination_pb2.Page],
@@ -74,10 +45,11 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
             request_iterator,
             Post.published_objects.filter(subscribers=context.caller),
             bundle_class=post_pb2.Posts,
-            adapter=PublicationDatePaginationAdapter(),
+            adapter=PostPreviewPaginationAdapter(),
             message_overrides={"is_preview": True},
         )
 
+    @query_budget(per_message=4)
     def ListOwnPosts(
         self,
         request_iterator: Iterator[pagination_pb2.Page],
@@ -87,10 +59,11 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
             request_iterator,
             Post.existing_objects.filter(author=context.caller),
             bundle_class=post_pb2.Posts,
-            adapter=PublicationDatePaginationAdapter(),
+            adapter=PostPreviewPaginationAdapter(),
             message_overrides={"is_preview": True},
         )
 
+    @query_budget(per_message=4)
     def ListDrafts(
         self,
         request_iterator: Iterator[pagination_pb2.Page],
@@ -100,10 +73,11 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
             request_iterator,
             Post.draft_objects.filter(author=context.caller),
             bundle_class=post_pb2.Posts,
-            adapter=CreationDatePaginationAdapter(),
+            adapter=DraftPreviewPaginationAdapter(),
             message_overrides={"is_preview": True},
         )
 
+    @query_budget(per_call=8)
     def Retrieve(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> post_pb2.Post:
@@ -123,12 +97,14 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
 
         return post.to_message(**overrides)
 
+    @query_budget(per_call=5)
     def Create(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> id_pb2.StringId:
         post = Post.objects.create(author=context.caller)
         return id_pb2.StringId(id=str(post.id))
 
+    @query_budget(per_call=15)
     def Publish(
         self, request: post_pb2.Publication, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -140,6 +116,7 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
         post.publish(anonymous=request.anonymous)
         return empty_pb2.Empty()
 
+    @query_budget(per_call=30)
     def Delete(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -151,6 +128,7 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
         post.delete()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=6)
     def UpdateSubscription(
         self, request: post_pb2.Subscription, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -166,6 +144,7 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
 
         return empty_pb2.Empty()
 
+    @query_budget(per_call=5)
     def Report(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -180,6 +159,7 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
         )
         return empty_pb2.Empty()
 
+    @query_budget(per_call=30)
     def Absolve(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -196,6 +176,7 @@ class PostService(PaginatorMixin, post_pb2_grpc.PostServiceServicer):
 
 
 class ChapterService(ImageUploadMixin, post_pb2_grpc.ChapterServiceServicer):
+    @query_budget(per_call=10)
     def Create(
         self, request: post_pb2.ChapterLocation, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -212,6 +193,7 @@ class ChapterService(ImageUploadMixin, post_pb2_grpc.ChapterServiceServicer):
         )
         return empty_pb2.Empty()
 
+    @query_budget(per_call=10)
     def Move(
         self, request: post_pb2.ChapterRelocation, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -221,6 +203,7 @@ class ChapterService(ImageUploadMixin, post_pb2_grpc.ChapterServiceServicer):
         chapter.save()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=10)
     def UpdateText(
         self, request: post_pb2.ChapterTextUpdate, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -235,6 +218,7 @@ class ChapterService(ImageUploadMixin, post_pb2_grpc.ChapterServiceServicer):
         chapter.save()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=20)
     def UpdateImage(
         self,
         request_iterator: Iterator[post_pb2.ChapterImageUpdate],
@@ -256,6 +240,7 @@ class ChapterService(ImageUploadMixin, post_pb2_grpc.ChapterServiceServicer):
         self.set_image(chapter, "image", image)
         return empty_pb2.Empty()
 
+    @query_budget(per_call=10)
     def Delete(
         self, request: post_pb2.ChapterLocation, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -265,36 +250,15 @@ class ChapterService(ImageUploadMixin, post_pb2_grpc.ChapterServiceServicer):
 
 
 class CommentService(PaginatorMixin, comment_pb2_grpc.CommentServiceServicer):
+    @query_budget(per_message=10)
     def List(
         self,
         request_iterator: Iterator[pagination_pb2.Page],
         context: grpc.ServicerContext,
     ) -> Iterator[comment_pb2.Comments]:
-        try:
-            post_id = next(request_iterator).context_id
-        except:
-            raise InvalidArgument("missing_context_id")
-
-        post = Post.existing_objects.get_published_readable_by(
-            context.caller, id=post_id
-        )
-
-        def on_items(comments: List[Comment]):
-            comments = sorted(comments, key=lambda c: c.date_created)
-            post.subscriptions.filter(user=context.caller).update(
-                last_comment_seen=comments[-1]
-            )
-            pk_set = set(c.id for c in comments)
-            fetched.send(sender=Comment, user=context.caller, pk_set=pk_set)
-
-        return self.paginate(
-            request_iterator,
-            post.comments.all(),
-            bundle_class=comment_pb2.Comments,
-            adapter=CreationDatePaginationAdapter(),
-            on_items=on_items,
-        )
+        return CommentPagination(request_iterator, context.caller)
 
+    @query_budget(per_call=10)
     def Create(
         self, request: comment_pb2.CommentCreation, context: grpc.ServicerContext
     ) -> id_pb2.StringId:
@@ -316,6 +280,7 @@ class CommentService(PaginatorMixin, comment_pb2_grpc.CommentServiceServicer):
         )
         return id_pb2.StringId(id=str(comment.id))
 
+    @query_budget(per_call=20)
     def Delete(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -327,6 +292,7 @@ class CommentService(PaginatorMixin, comment_pb2_grpc.CommentServiceServicer):
         comment.delete()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=5)
     def Report(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -342,6 +308,7 @@ class CommentService(PaginatorMixin, comment_pb2_grpc.CommentServiceServicer):
         )
         return empty_pb2.Empty()
 
+    @query_budget(per_call=30)
     def Absolve(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -4,10 +4,11 @@ from django.db import IntegrityError
 from django.db.models.signals import ModelSignal, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from core.signals import post_soft_delete
+from core.signals import post_bulk_soft_delete, post_soft_delete
 
+from .feed import candidate_pool
 from .models import Chapter, Comment, Post, Stack, Vote
-from .tasks import remove_post_data, remove_user_data
+from .tasks import remove_post_data, remove_posts_data, remove_user_data
 
 fetched = ModelSignal(use_caching=True)
 
@@ -23,11 +24,28 @@ def on_user_post_soft_delete(instance: AbstractUser, **kwargs):
     remove_user_data.delay(user_id=str(instance.id))
 
 
+@receiver(post_save, sender=Post)
+def on_post_post_save(instance: Post, **kwargs):
+    if instance.date_published and instance.life > 0 and not instance.is_deleted:
+        candidate_pool.add(instance.date_published, instance.id, instance.author_id)
+    else:
+        candidate_pool.remove(instance.id)
+
+
 @receiver(post_soft_delete, sender=Post)
 def on_post_post_soft_delete(instance: Post, **kwargs):
+    candidate_pool.remove(instance.id)
     remove_post_data.delay(post_id=str(instance.id))
 
 
+@receiver(post_bulk_soft_delete, sender=Post)
+def on_post_post_bulk_soft_delete(pk_set: list, **kwargs):
+    for post_id in pk_set:
+        candidate_pool.remove(post_id)
+
+    remove_posts_data.delay(post_ids=[str(i) for i in pk_set])
+
+
 @receiver(post_save, sender=Chapter)
 def on_chapter_post_save(instance: Chapter, **kwargs):
     if len(instance.position) > 30:
@@ -56,8 +74,4 @@ def on_vote_post_save(instance: Vote, created: bool, **kwargs):
     if not created:
         return
 
-    if instance.spread:
-        instance.post.life += 4
-        instance.post.save()
-
-    instance.user.stack.posts.remove(instance.post)
+    Vote.objects.apply([instance])
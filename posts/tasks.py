@@ -1,35 +1,103 @@
+from collections import Counter
 from datetime import timedelta
+from typing import Dict, List
 
 from celery import shared_task
+from django.conf import settings
+from django.db.transaction import atomic
 from django.utils.timezone import now
 
 from .models import Chapter, Comment, Post, Stack, Visibility
 
 
 @shared_task
-def cleanup_stacks():
+def cleanup_stacks() -> Dict[str, int]:
     deadline = now() - timedelta(days=1)
+    visibilities = Visibility.objects.filter(stack__date_last_filled__lte=deadline)
+    stack_ids = set()
+    post_ids = set()
+    last_id = 0
 
-    while stacks := Stack.objects.filter(
-        date_last_filled__lte=deadline, posts__isnull=False
+    while rows := list(
+        visibilities.filter(id__gt=last_id)
+        .order_by("id")
+        .values_list("id", "stack_id", "post_id")[: settings.STACK_CLEANUP_CHUNK_SIZE]
     ):
-        for stack in stacks[:100]:
-            stack.drain()
+        with atomic():
+            Post.objects.add_life(Counter(row[2] for row in rows))
+            Visibility.objects.filter(id__in=[row[0] for row in rows]).delete()
 
+        stack_ids.update(row[1] for row in rows)
+        post_ids.update(row[2] for row in rows)
+        last_id = rows[-1][0]
 
-@shared_task
+    return {"stacks": len(stack_ids), "posts": len(post_ids)}
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
 def remove_user_data(user_id: str):
-    while posts := Post.objects.filter(author_id=user_id, is_deleted=False):
-        for post in posts[:100]:
-            post.soft_delete()
+    for model in [Post, Comment]:
+        remaining = model.objects.filter(author_id=user_id, is_deleted=False)
 
-    while comments := Comment.objects.filter(author_id=user_id, is_deleted=False):
-        for comment in comments[:100]:
-            comment.soft_delete()
+        while pk_set := list(
+            remaining.order_by("pk").values_list("pk", flat=True)[
+                : settings.SOFT_DELETE_CHUNK_SIZE
+            ]
+        ):
+            with atomic():
+                model.objects.filter(pk__in=pk_set).soft_delete()
 
 
 @shared_task
 def remove_post_data(post_id: str):
-    Chapter.objects.filter(post_id=post_id).delete()
-    Comment.objects.filter(post_id=post_id).delete()
-    Visibility.objects.filter(post__is_deleted=True).delete()
+    remove_posts_data(post_ids=[post_id])
+
+
+@shared_task
+def remove_posts_data(post_ids: List[str]):
+    chapters = Chapter.objects.filter(post_id__in=post_ids)
+    storage = Chapter._meta.get_field("image").storage
+
+    while rows := list(
+        chapters.order_by("id").values_list("id", "image")[
+            : settings.POST_DATA_CHUNK_SIZE
+        ]
+    ):
+        chunk = Chapter.objects.filter(id__in=[i for i, _ in rows])
+
+        with atomic():
+            chunk.update(image="")
+            chunk.delete()
+
+        storage.delete_many([image for _, image in rows if image])
+
+    for model in [Comment, Visibility]:
+        queryset = model.objects.filter(post_id__in=post_ids)
+
+        while pk_set := list(
+            queryset.order_by("pk").values_list("pk", flat=True)[
+                : settings.POST_DATA_CHUNK_SIZE
+            ]
+        ):
+            model.objects.filter(pk__in=pk_set).delete()
+
+
+@shared_task
+def cleanup_orphans() -> Dict[str, int]:
+    post_ids = set()
+
+    for model in [Chapter, Comment, Visibility]:
+        post_ids.update(
+            model.objects.filter(post__is_deleted=True)
+            .order_by()
+            .values_list("post_id", flat=True)
+            .distinct()
+        )
+
+    post_ids = sorted(str(i) for i in post_ids)
+    chunk_size = settings.POST_DATA_CHUNK_SIZE
+
+    for i in range(0, len(post_ids), chunk_size):
+        remove_posts_data(post_ids=post_ids[i : i + chunk_size])
+
+    return {"posts": len(post_ids)}
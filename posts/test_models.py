@@ -1,13 +1,20 @@
+import threading
+import uuid
+from datetime import timedelta
 from time import sleep
+from unittest import skipIf
 from unittest.case import TestCase
 
+from django.contrib.auth import get_user_model
 from django.core.files.images import ImageFile
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test import TransactionTestCase, override_settings
 from django.utils.timezone import now
 from grpc_interceptor.exceptions import InvalidArgument
 
 from core.tests import get_asset
 
+from .feed import CandidatePool, select_posts
 from .models import Chapter, Comment, Post, Vote, position_between
 from .tests import BaseCommentTestCase, BasePostTestCase, PublishedPostTestCase
 
@@ -173,6 +180,94 @@ class Stack_fill(PublishedPostTestCase):
         self.assertEqual(stack.posts.count(), 10)
         self.assertEqual(stack.posts.filter(author=self.other_user).count(), 0)
 
+    def test_voted(self):
+        Vote.objects.create(user=self.other_user, post=self.post, spread=False)
+        stack = self.other_user.stack
+        stack.fill()
+        self.assertEqual(stack.posts.count(), 0)
+
+    def test_stale_pool(self):
+        candidates = [
+            (self.post.date_published, self.post.id, self.post.author_id),
+            (now(), uuid.uuid4(), self.post.author_id),
+        ]
+        pool = CandidatePool(
+            load=lambda: candidates, lifetime=timedelta(weeks=4), timeout=60
+        )
+        Post.objects.filter(id=self.post.id).update(life=0)
+        self.assertEqual(len(list(pool.iterate(set()))), 2)
+        self.assertEqual(select_posts(pool, self.other_user.id, set(), 10), [])
+
+    @override_settings(FEED_CANDIDATE_BATCH_SIZE=1)
+    def test_voted_query_count(self):
+        posts = []
+
+        for i in range(8):
+            post = Post.objects.create(author=self.main_user)
+            Chapter.objects.create(
+                post=post, position=post.chapter_position(0), text="Text"
+            )
+            post.publish(anonymous=False)
+            posts.append(post)
+
+        Vote.objects.bulk_create(
+            [Vote(user=self.other_user, post=p, spread=False) for p in posts]
+        )
+        Post.objects.filter(id=self.post.id).update(date_published=now())
+        pool = CandidatePool(
+            load=lambda: Post.active_objects.values_list(
+                "date_published", "id", "author_id"
+            ),
+            lifetime=timedelta(weeks=4),
+            timeout=60,
+        )
+        pool.reload()
+
+        with self.assertNumQueries(2):
+            selected = select_posts(pool, self.other_user.id, set(), 1)
+
+        self.assertEqual(selected, [str(self.post.id)])
+
+
+class CandidatePool_iterate(TestCase):
+    def setUp(self):
+        self.author_ids = [uuid.uuid4(), uuid.uuid4()]
+        self.post_ids = [uuid.uuid4() for _ in range(4)]
+        self.date = now()
+        self.pool = CandidatePool(
+            load=lambda: [
+                (self.date - timedelta(hours=i), post_id, self.author_ids[i % 2])
+                for i, post_id in enumerate(self.post_ids)
+            ],
+            lifetime=timedelta(weeks=4),
+            timeout=60,
+        )
+
+    def test(self):
+        self.assertEqual(
+            list(self.pool.iterate(set())), [str(i) for i in reversed(self.post_ids)]
+        )
+        self.assertEqual(
+            list(self.pool.iterate({self.author_ids[1]})),
+            [str(self.post_ids[2]), str(self.post_ids[0])],
+        )
+
+    def test_add(self):
+        post_id = uuid.uuid4()
+        list(self.pool.iterate(set()))
+        self.pool.add(self.date + timedelta(hours=1), post_id, self.author_ids[0])
+        self.assertEqual(list(self.pool.iterate(set()))[-1], str(post_id))
+
+    def test_remove(self):
+        list(self.pool.iterate(set()))
+        self.pool.remove(self.post_ids[0])
+        self.assertNotIn(str(self.post_ids[0]), list(self.pool.iterate(set())))
+
+    def test_expired(self):
+        list(self.pool.iterate(set()))
+        self.pool.add(now() - timedelta(weeks=5), uuid.uuid4(), self.author_ids[0])
+        self.assertEqual(len(list(self.pool.iterate(set()))), len(self.post_ids))
+
 
 class Stack_drain(PublishedPostTestCase):
     def test(self):
@@ -181,16 +276,49 @@ class Stack_drain(PublishedPostTestCase):
         stack.fill()
         stack.drain()
         self.assertEqual(stack.posts.count(), 0)
+        self.post.refresh_from_db()
         self.assertEqual(self.post.life, post_life)
 
 
+class Post_add_life(PublishedPostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_post = Post.objects.create(author=self.main_user)
+
+    def test(self):
+        post_life = self.post.life
+        count = Post.objects.add_life({self.post.id: 3, self.other_post.id: 2})
+        self.assertEqual(count, 2)
+        self.post.refresh_from_db()
+        self.other_post.refresh_from_db()
+        self.assertEqual(self.post.life, post_life + 3)
+        self.assertEqual(self.other_post.life, 2)
+
+    def test_floor(self):
+        count = Post.objects.add_life({self.post.id: -100, self.other_post.id: -1})
+        self.assertEqual(count, 1)
+        self.post.refresh_from_db()
+        self.other_post.refresh_from_db()
+        self.assertEqual(self.post.life, 0)
+        self.assertEqual(self.other_post.life, 0)
+
+    def test_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(Post.objects.add_life({self.post.id: 0}), 0)
+
+    def test_query_count(self):
+        with self.assertNumQueries(1):
+            Post.objects.add_life({self.post.id: 1, self.other_post.id: -1})
+
+
 class Vote_create(PublishedPostTestCase):
     def test_spread(self):
         post_life = self.post.life
         self.other_user.stack.fill()
         stack_count = self.other_user.stack.posts.count()
         Vote.objects.create(user=self.other_user, post=self.post, spread=True)
-        self.assertEqual(self.post.life, post_life + 4)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, post_life + Vote.SPREAD_LIFE)
         self.assertEqual(self.other_user.stack.posts.count(), stack_count - 1)
 
     def test_no_spread(self):
@@ -198,6 +326,7 @@ class Vote_create(PublishedPostTestCase):
         self.other_user.stack.fill()
         stack_count = self.other_user.stack.posts.count()
         Vote.objects.create(user=self.other_user, post=self.post, spread=False)
+        self.post.refresh_from_db()
         self.assertEqual(self.post.life, post_life)
         self.assertEqual(self.other_user.stack.posts.count(), stack_count - 1)
 
@@ -210,3 +339,85 @@ class Vote_create(PublishedPostTestCase):
 
         with self.assertRaises(IntegrityError):
             Vote.objects.create(user=self.other_user, post=self.post, spread=True)
+
+    def test_stale_post(self):
+        post_life = self.post.life
+        voter = get_user_model().objects.create_user(
+            username="voter", email="voter@example.com"
+        )
+        posts = [Post.objects.get(id=self.post.id) for _ in range(2)]
+        Vote.objects.create(user=self.other_user, post=posts[0], spread=True)
+        Vote.objects.create(user=voter, post=posts[1], spread=True)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, post_life + Vote.SPREAD_LIFE * 2)
+
+
+class Vote_cast(PublishedPostTestCase):
+    def test(self):
+        post_life = self.post.life
+        self.other_user.stack.fill()
+        stack_count = self.other_user.stack.posts.count()
+        Vote.objects.cast([Vote(user=self.other_user, post=self.post, spread=True)])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, post_life + Vote.SPREAD_LIFE)
+        self.assertEqual(self.other_user.stack.posts.count(), stack_count - 1)
+
+    def test_same_user(self):
+        with self.assertRaises(IntegrityError):
+            Vote.objects.cast([Vote(user=self.main_user, post=self.post, spread=True)])
+
+        self.assertFalse(Vote.objects.exists())
+
+    def test_bulk_create(self):
+        post_life = self.post.life
+        Vote.objects.bulk_create(
+            [Vote(user=self.other_user, post=self.post, spread=True)]
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, post_life)
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite serializes concurrent writers")
+class Vote_create_concurrently(TransactionTestCase):
+    VOTER_COUNT = 8
+
+    def setUp(self):
+        User = get_user_model()
+        author, *self.voters = [
+            User.objects.create_user(username=f"user{i}", email=f"user{i}@example.com")
+            for i in range(self.VOTER_COUNT + 1)
+        ]
+        self.post = Post.objects.create(author=author)
+        Chapter.objects.create(
+            post=self.post, position=self.post.chapter_position(0), text="Text"
+        )
+        self.post.publish(anonymous=False)
+
+    def test(self):
+        post_life = self.post.life
+        barrier = threading.Barrier(self.VOTER_COUNT)
+        errors = []
+
+        def vote(user):
+            try:
+                post = Post.objects.get(id=self.post.id)
+                barrier.wait()
+                Vote.objects.create(user=user, post=post, spread=True)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vote, args=(u,)) for u in self.voters]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.post.refresh_from_db()
+        self.assertEqual(
+            self.post.life, post_life + Vote.SPREAD_LIFE * self.VOTER_COUNT
+        )
@@ -3,20 +3,25 @@ import itertools
 from datetime import timedelta
 from typing import Iterator, List
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.core.files.images import ImageFile
+from django.core.files.images import ImageFile, get_image_dimensions
+from django.db import IntegrityError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now
 from grpc_interceptor.exceptions import InvalidArgument, PermissionDenied
 
+from core.tasks import empty_trash
 from core.tests import ImageTestCaseMixin, PaginationTestCase, get_asset
 from notifications.models import CountUnit, Notification
 from notifications.tests import BaseNotificationTestCase
 from protos import comment_pb2, id_pb2, pagination_pb2, post_pb2
 from users.tests import AuthenticatedTestCase
 
-from .models import Chapter, Comment, Post
+from .models import Chapter, Comment, Post, Vote
 from .services import ChapterService, CommentService, PostService
 
 
@@ -80,6 +85,7 @@ class PostPaginationTestCase(PostServiceTestCase, PaginationTestCase):
         self.assertEqual(item.id, str(self.posts[position].id))
         self.assertTrue(item.is_preview)
         self.assertEqual(len(item.chapters), 1)
+        self.assertEqual(item.chapters[0].text, f"Text {self.posts[position].id}/0")
 
     def run_test_deleted_posts(self):
         for post in self.posts[-6:]:
@@ -102,6 +108,17 @@ class PostPaginationTestCase(PostServiceTestCase, PaginationTestCase):
         for i, post in enumerate(posts.posts):
             self.assertEqual(post.id, str(self.posts[i + self.page_size].id))
 
+    def run_test_query_count(self):
+        with CaptureQueriesContext(connection) as small_page:
+            next(self.paginate([pagination_pb2.Page(forward=True, size=1)]))
+
+        with CaptureQueriesContext(connection) as full_page:
+            page_requests = [pagination_pb2.Page(forward=True, size=self.page_size)]
+            posts = next(self.paginate(page_requests))
+
+        self.assertEqual(len(posts.posts), self.page_size)
+        self.assertEqual(len(full_page), len(small_page))
+
     def _create_test_posts(self) -> List[Post]:
         raise NotImplementedError
 
@@ -151,6 +168,76 @@ class PostService_ListFeed(PostServiceTestCase):
             for i, chapter in enumerate(next_post.chapters):
                 self.assertEqual(chapter.text, chapters[i].text)
 
+    def test_votes(self):
+        posts = self._create_some_posts()
+        requests = self._create_requests(posts)
+        list(self.service.ListFeed(iter(requests), self.grpc_context))
+        votes = Vote.objects.filter(user=self.main_user)
+        self.assertEqual(votes.count(), len(posts))
+        self.assertEqual(votes.filter(spread=True).count(), (len(posts) + 1) // 2)
+        self.assertEqual(self.main_user.stack.posts.count(), 0)
+
+        for request in requests:
+            post = Post.objects.get(id=request.post_id)
+            self.assertEqual(post.life, 9 + (Vote.SPREAD_LIFE if request.spread else 0))
+
+    @override_settings(FEED_VOTE_BATCH_SIZE=4, FEED_VOTE_BATCH_WINDOW=3600)
+    def test_votes_batched(self):
+        posts = self._create_some_posts()
+        feed = self.service.ListFeed(
+            iter(self._create_requests(posts)), self.grpc_context
+        )
+
+        for _ in range(3 + 3):
+            next(feed)
+
+        self.assertEqual(Vote.objects.filter(user=self.main_user).count(), 0)
+        next(feed)
+        self.assertEqual(Vote.objects.filter(user=self.main_user).count(), 4)
+
+    def test_own_post(self):
+        posts = self._create_posts(author=self.other_user, count=5, published=True)
+        own_post = self._create_posts(author=self.main_user, count=1, published=True)
+        requests = self._create_requests(own_post + posts)
+        feed = self.service.ListFeed(iter(requests), self.grpc_context)
+
+        with self.assertRaises(IntegrityError):
+            list(feed)
+
+        self.assertEqual(Vote.objects.filter(user=self.main_user).count(), 0)
+
+    @override_settings(FEED_VOTE_BATCH_SIZE=4, FEED_VOTE_BATCH_WINDOW=3600)
+    def test_own_post_after_votes(self):
+        posts = self._create_posts(author=self.other_user, count=5, published=True)
+        own_post = self._create_posts(author=self.main_user, count=1, published=True)
+        requests = self._create_requests(posts[:2] + own_post)
+        feed = self.service.ListFeed(iter(requests), self.grpc_context)
+
+        with self.assertRaises(IntegrityError):
+            list(feed)
+
+        self.assertEqual(Vote.objects.filter(user=self.main_user).count(), 2)
+
+    @override_settings(FEED_VOTE_BATCH_SIZE=4, FEED_VOTE_BATCH_WINDOW=3600)
+    def test_voted_post(self):
+        posts = self._create_posts(author=self.other_user, count=5, published=True)
+        Vote.objects.create(user=self.main_user, post=posts[-1], spread=False)
+        requests = self._create_requests(posts[:2] + posts[-1:])
+        feed = self.service.ListFeed(iter(requests), self.grpc_context)
+
+        with self.assertRaises(IntegrityError):
+            list(feed)
+
+        self.assertEqual(Vote.objects.filter(user=self.main_user).count(), 3)
+
+    def test_unknown_post(self):
+        self._create_some_posts()
+        request = post_pb2.Vote(post_id="00000000-0000-0000-0000-000000000000")
+        feed = self.service.ListFeed(iter([request]), self.grpc_context)
+
+        with self.assertRaises(ObjectDoesNotExist):
+            list(feed)
+
     def test_empty(self):
         feed = self.service.ListFeed([], self.grpc_context)
         self.assertEqual(list(feed), [])
@@ -292,6 +379,29 @@ class PostService_ListArchive(PostPaginationTestCase):
     def test_deleted_posts(self):
         self.run_test_deleted_posts()
 
+    def test_query_count(self):
+        self.run_test_query_count()
+
+    @override_settings(PAGINATION_CURSOR_CODEC="core.pagination.BinaryCursorCodec")
+    def test_binary_cursor(self):
+        self.run_test(self.check)
+        self.run_test_reverse_previous(self.check)
+
+    @override_settings(PAGINATION_CURSOR_CODEC="core.pagination.BinaryCursorCodec")
+    def test_binary_cursor_tampered(self):
+        page_requests = [pagination_pb2.Page(forward=True, size=self.page_size)]
+        posts_iterator = self.paginate(page_requests)
+        posts = next(posts_iterator)
+        value = posts.next.data[0].value
+        value = ("B" if value[0] == "A" else "A") + value[1:]
+        cursor = pagination_pb2.Cursor(
+            data=[pagination_pb2.KeyValuePair(value=value)], is_next=True
+        )
+        page_requests.append(pagination_pb2.Page(forward=True, cursor=cursor))
+
+        with self.assertRaises(InvalidArgument):
+            next(posts_iterator)
+
 
 class PostService_ListOwnPosts(PostPaginationTestCase):
     date_field = "date_published"
@@ -333,6 +443,9 @@ class PostService_ListOwnPosts(PostPaginationTestCase):
     def test_deleted_posts(self):
         self.run_test_deleted_posts()
 
+    def test_query_count(self):
+        self.run_test_query_count()
+
 
 class PostService_ListDrafts(PostPaginationTestCase):
     def _create_test_posts(self) -> List[Post]:
@@ -374,6 +487,9 @@ class PostService_ListDrafts(PostPaginationTestCase):
     def test_deleted_posts(self):
         self.run_test_deleted_posts()
 
+    def test_query_count(self):
+        self.run_test_query_count()
+
 
 class PostService_Retrieve(PostServiceTestCase):
     def test(self):
@@ -911,7 +1027,32 @@ class ChapterService_UpdateImage(ImageTestCaseMixin, ChapterServiceTestCase):
     def test(self):
         self.service.UpdateImage(self.make_update_request("jpeg"), self.grpc_context)
         self.chapter.refresh_from_db()
-        self.assertRegex(str(self.chapter.image), r".*\." + "jpeg")
+        self.assertRegex(str(self.chapter.image), r".*\.\d+\.webp$")
+
+    def test_variants(self):
+        self.service.UpdateImage(self.make_update_request("jpeg"), self.grpc_context)
+        self.chapter.refresh_from_db()
+        storage = self.chapter.image.storage
+        names = storage.get_related_names(self.chapter.image.name)
+        self.assertTrue(any(storage.exists(n) for n in names if n.endswith(".jpeg")))
+        self.assertEqual(
+            (self.chapter.width, self.chapter.height),
+            get_image_dimensions(self.chapter.image),
+        )
+        variant_names = [
+            storage.get_variant_name(self.chapter.image.name, w)
+            for w in settings.IMAGE_VARIANT_WIDTHS
+        ]
+        self.assertEqual([storage.exists(n) for n in variant_names].count(True), 1)
+        self.chapter.image.delete()
+        empty_trash()
+        self.assertFalse(any(storage.exists(n) for n in names))
+
+    @override_settings(IMAGE_VARIANT_WIDTHS=[])
+    def test_no_variants(self):
+        self.service.UpdateImage(self.make_update_request("jpeg"), self.grpc_context)
+        self.chapter.refresh_from_db()
+        self.assertRegex(str(self.chapter.image), r".*\.jpeg$")
 
     def test_empty(self):
         location = post_pb2.ChapterLocation(post_id=str(self.post.id), position=0)
@@ -926,7 +1067,7 @@ class ChapterService_UpdateImage(ImageTestCaseMixin, ChapterServiceTestCase):
         self.service.UpdateImage(self.make_update_request("jpeg"), self.grpc_context)
         self.chapter.refresh_from_db()
         self.assertEqual(self.chapter.text, "")
-        self.assertRegex(str(self.chapter.image), r".*\." + "jpeg")
+        self.assertRegex(str(self.chapter.image), r".*\.\d+\.webp$")
 
     def test_invalid_position(self):
         with self.assertRaises(InvalidArgument):
@@ -1,9 +1,17 @@
 from datetime import timedelta
 
+from django.contrib.auth import get_user_model
+from django.core.files.images import ImageFile
+from django.test import override_settings
 from django.utils.timezone import now
 
-from .models import Stack
-from .tasks import cleanup_stacks
+from core.signals import post_bulk_soft_delete
+from core.tasks import empty_trash
+from core.tests import get_asset
+from notifications.models import Notification
+
+from .models import Chapter, Comment, Post, Stack, Visibility
+from .tasks import cleanup_orphans, cleanup_stacks, remove_post_data, remove_user_data
 from .tests import PublishedPostTestCase
 
 
@@ -18,10 +26,140 @@ class Task_cleanup_stacks(PublishedPostTestCase):
         Stack.objects.filter(user=self.other_user).update(
             date_last_filled=now() - timedelta(days=1)
         )
-        cleanup_stacks.delay()
+        result = cleanup_stacks.delay()
         self.assertEqual(self.stack.posts.count(), 0)
+        self.assertEqual(result.get(), {"stacks": 1, "posts": 1})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, 10)
+
+    def test_many(self):
+        users = [
+            get_user_model().objects.create_user(
+                username=f"user{i}", email=f"user{i}@example.com"
+            )
+            for i in range(3)
+        ]
+
+        for user in users:
+            user.stack.fill()
+
+        Stack.objects.update(date_last_filled=now() - timedelta(days=1))
+
+        with override_settings(STACK_CLEANUP_CHUNK_SIZE=2):
+            result = cleanup_stacks.delay()
+
+        self.assertEqual(result.get(), {"stacks": 4, "posts": 1})
+        self.assertEqual(Visibility.objects.count(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.life, 10)
 
     def test_to_soon(self):
         self.assertEqual(self.stack.posts.count(), 1)
-        cleanup_stacks.delay()
+        self.assertEqual(cleanup_stacks.delay().get(), {"stacks": 0, "posts": 0})
         self.assertEqual(self.stack.posts.count(), 1)
+
+
+class Task_remove_user_data(PublishedPostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.post] + [
+            Post.objects.create(author=self.main_user) for _ in range(4)
+        ]
+        other_post = Post.objects.create(author=self.other_user)
+        self.comments = [
+            Comment.objects.create(post=other_post, author=self.main_user, text="Text")
+            for _ in range(3)
+        ]
+        Comment.objects.create(post=self.post, author=self.other_user, text="Text")
+
+    def test(self):
+        self.assertEqual(Notification.objects.count(), 1)
+        remove_user_data.delay(user_id=str(self.main_user.id))
+        posts = Post.objects.filter(author=self.main_user)
+        comments = Comment.objects.filter(author=self.main_user)
+        self.assertFalse(posts.filter(is_deleted=False).exists())
+        self.assertEqual(set(posts.values_list("life", flat=True)), {0})
+        self.assertFalse(comments.filter(is_deleted=False).exists())
+        self.assertEqual(set(comments.values_list("text", flat=True)), {""})
+        self.assertFalse(Chapter.objects.filter(post=self.post).exists())
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
+        self.assertEqual(Notification.objects.count(), 0)
+
+    @override_settings(SOFT_DELETE_CHUNK_SIZE=2)
+    def test_chunks(self):
+        chunks = []
+
+        def on_post_bulk_soft_delete(sender, pk_set, **kwargs):
+            chunks.append((sender, len(pk_set)))
+
+        post_bulk_soft_delete.connect(on_post_bulk_soft_delete)
+
+        try:
+            remove_user_data.delay(user_id=str(self.main_user.id))
+        finally:
+            post_bulk_soft_delete.disconnect(on_post_bulk_soft_delete)
+
+        self.assertEqual(
+            chunks,
+            [(Post, 2), (Post, 2), (Post, 1), (Comment, 2), (Comment, 1)],
+        )
+
+    def test_resume(self):
+        Comment.objects.filter(id=self.comments[0].id).soft_delete()
+        Post.objects.filter(id__in=[p.id for p in self.posts[:2]]).soft_delete()
+        remove_user_data.delay(user_id=str(self.main_user.id))
+        self.assertFalse(
+            Post.objects.filter(author=self.main_user, is_deleted=False).exists()
+        )
+        self.assertFalse(
+            Comment.objects.filter(author=self.main_user, is_deleted=False).exists()
+        )
+
+
+class Task_remove_post_data(PublishedPostTestCase):
+    def setUp(self):
+        super().setUp()
+
+        with open(get_asset("image.png"), "rb") as asset:
+            self.chapter = Chapter.objects.create(
+                post=self.post,
+                position=self.post.chapter_position(1),
+                image=ImageFile(file=asset, name="image.png"),
+            )
+
+        self.storage = self.chapter.image.storage
+        self.image_name = self.chapter.image.name
+        self.other_post = Post.objects.create(author=self.main_user)
+        Chapter.objects.create(
+            post=self.other_post, position=self.other_post.chapter_position(0)
+        )
+        Comment.objects.create(post=self.post, author=self.other_user, text="Text")
+        self.other_user.stack.fill()
+
+    def test(self):
+        self.assertTrue(self.storage.exists(self.image_name))
+        remove_post_data.delay(post_id=str(self.post.id))
+        self.assertFalse(Chapter.objects.filter(post=self.post).exists())
+        self.assertFalse(Comment.objects.filter(post=self.post).exists())
+        self.assertFalse(Visibility.objects.filter(post=self.post).exists())
+        self.assertTrue(self.storage.exists(self.image_name))
+        empty_trash()
+        self.assertFalse(self.storage.exists(self.image_name))
+        self.assertTrue(Chapter.objects.filter(post=self.other_post).exists())
+
+    @override_settings(POST_DATA_CHUNK_SIZE=1)
+    def test_chunks(self):
+        remove_post_data.delay(post_id=str(self.post.id))
+        self.assertFalse(Chapter.objects.filter(post=self.post).exists())
+        empty_trash()
+        self.assertFalse(self.storage.exists(self.image_name))
+
+    def test_cleanup_orphans(self):
+        Post.objects.filter(id=self.post.id).update(is_deleted=True)
+        self.assertEqual(cleanup_orphans.delay().get(), {"posts": 1})
+        self.assertFalse(Chapter.objects.filter(post=self.post).exists())
+        self.assertFalse(Visibility.objects.filter(post=self.post).exists())
+        empty_trash()
+        self.assertFalse(self.storage.exists(self.image_name))
+        self.assertTrue(Chapter.objects.filter(post=self.other_post).exists())
+        self.assertEqual(cleanup_orphans.delay().get(), {"posts": 0})
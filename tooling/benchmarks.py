@@ -0,0 +1,76 @@
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.timezone import now
+
+from core.services import ImageUploadMixin
+from core.tests import get_asset
+from notifications.tasks import send_notifications
+from posts.feed import candidate_pool
+from posts.models import Comment, Post, Stack, Subscription, Vote
+from protos import image_pb2
+
+scenarios: Dict[str, Callable[[int], Callable[[], None]]] = {}
+
+
+def scenario(func: Callable[[int], Callable[[], None]]) -> Callable:
+    scenarios[func.__name__] = func
+    return func
+
+
+def create_users(count: int, prefix: str = "benchmark") -> list:
+    User = get_user_model()
+    return User.objects.bulk_create(
+        [
+            User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com")
+            for i in range(count)
+        ]
+    )
+
+
+@scenario
+def notification_fan_out(size: int) -> Callable[[], None]:
+    author, *subscribers = create_users(size + 1)
+    post = Post.objects.create(author=author)
+    Subscription.objects.bulk_create(
+        [Subscription(user=user, post=post) for user in subscribers]
+    )
+    (comment,) = Comment.objects.bulk_create(
+        [Comment(post=post, author=author, text="Benchmark")]
+    )
+    return lambda: send_notifications(comment_id=str(comment.id))
+
+
+@scenario
+def feed_fill(size: int) -> Callable[[], None]:
+    author, user = create_users(2)
+    date_published = now()
+    posts = Post.objects.bulk_create(
+        [
+            Post(author=author, date_published=date_published, life=1)
+            for _ in range(size + Stack.MAX_SIZE)
+        ]
+    )
+    Vote.objects.bulk_create(
+        [Vote(user=user, post=post, spread=False) for post in posts[:size]]
+    )
+    stack, _ = Stack.objects.get_or_create(user=user)
+    candidate_pool.clear()
+    return stack.fill
+
+
+@scenario
+def image_upload(size: int) -> Callable[[], None]:
+    with open(get_asset("image.png"), "rb") as image:
+        data = image.read()
+
+    data = data.ljust(settings.FILE_UPLOAD_MAX_MEMORY_SIZE, b"\0")
+    chunks = [
+        image_pb2.ImageChunk(data=data[i : i + size]) for i in range(0, len(data), size)
+    ]
+
+    def run():
+        ImageUploadMixin().get_image("benchmark", iter(chunks)).close()
+
+    return run
@@ -0,0 +1,43 @@
+import resource
+import tracemalloc
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+from django.db.transaction import atomic, set_rollback
+from django.test.utils import CaptureQueriesContext
+
+from tooling.benchmarks import scenarios
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("scenario", choices=sorted(scenarios))
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--memory", action="store_true")
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("size\tqueries\tseconds\tpeak_kib\trss_kib")
+
+        for size in kwargs["sizes"]:
+            with atomic():
+                run = scenarios[kwargs["scenario"]](size)
+
+                if kwargs["memory"]:
+                    tracemalloc.start()
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = perf_counter()
+                    run()
+                    elapsed = perf_counter() - start
+
+                if kwargs["memory"]:
+                    peak = tracemalloc.get_traced_memory()[1] // 1024
+                    tracemalloc.stop()
+                else:
+                    peak = "-"
+
+                set_rollback(True)
+
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(f"{size}\t{len(queries)}\t{elapsed:.3f}\t{peak}\t{rss}")
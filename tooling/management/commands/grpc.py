@@ -1,27 +1,48 @@
+import asyncio
 import signal
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandParser
 from django.utils import autoreload
 
-from core.grpc import create_server
+from core.grpc import connection_usage, create_aio_server, create_server
+from core.metrics import start_metrics_server
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--aio", action="store_true")
+        parser.add_argument("--metrics-port", type=int, default=settings.METRICS_PORT)
+
     def handle(self, *args, **kwargs):
         if settings.DEBUG:
             autoreload.run_with_reloader(self.run, **kwargs)
         else:
-            self.run()
+            self.run(**kwargs)
 
     def run(self, *args, **kwargs):
         autoreload.raise_last_exception()
+        self.loop = None
+        metrics_server = None
 
         if not settings.DEBUG:
             for sig in [signal.SIGHUP, signal.SIGINT, signal.SIGTERM]:
-                signal.signal(sig, lambda: self.stop_server())
+                signal.signal(sig, self.stop_server)
+
+        if metrics_port := kwargs.get("metrics_port"):
+            metrics_server = start_metrics_server(metrics_port)
+            print(f"Metrics served on port {metrics_port}")
+
+        try:
+            if kwargs.get("aio"):
+                asyncio.run(self.run_aio_server())
+            else:
+                self.run_server()
+        finally:
+            connection_usage.flush()
 
-        self.run_server()
+            if metrics_server:
+                metrics_server.shutdown()
 
     def run_server(self):
         server = create_server()
@@ -37,5 +58,25 @@ class Command(BaseCommand):
             self.stop_server()
             print("gRPC server stopped")
 
+    async def run_aio_server(self):
+        server = create_aio_server()
+        self.server = server
+        self.loop = asyncio.get_running_loop()
+
+        try:
+            print("gRPC server starting...")
+            await server.start()
+            print("gRPC server started")
+            await server.wait_for_termination()
+        finally:
+            print("gRPC server stopping...")
+            await server.stop(grace=10)
+            print("gRPC server stopped")
+
     def stop_server(self, *args, **kwargs):
-        self.server.stop(grace=10)
+        if self.loop:
+            self.loop.call_soon_threadsafe(
+                lambda: self.loop.create_task(self.server.stop(grace=10))
+            )
+        else:
+            self.server.stop(grace=10)
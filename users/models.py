@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Optional, Tuple, Type
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, UserManager
@@ -7,6 +7,7 @@ from django.core.validators import MaxLengthValidator, MinLengthValidator
 from django.db import models
 from django.utils.timezone import now
 from django.utils.translation import gettext as _
+from google.protobuf.message import Message
 
 from core import jwt
 from core.models import SoftDeleteModel, TimestampModel, UUIDModel
@@ -73,16 +74,18 @@ class User(AbstractUser, UUIDModel, SoftDeleteModel):
     is_banned = models.BooleanField(default=False)
     date_ban_end = models.DateTimeField(null=True, blank=True)
 
-    def get_message_fields(self, **overrides) -> List[str]:
+    def get_message_fields(
+        self, message_class: Type[Message], **overrides
+    ) -> Optional[Iterable[str]]:
         if overrides.get("is_banned", self.is_banned) and not self.date_ban_end:
             fields = ["id", "is_banned"]
 
-            if self._message_class == user_pb2.User:
+            if message_class == user_pb2.User:
                 fields.append("date_joined")
 
             return fields
 
-        return super().get_message_fields(**overrides)
+        return super().get_message_fields(message_class, **overrides)
 
     @property
     def is_alive(self) -> bool:
@@ -137,6 +140,11 @@ class User(AbstractUser, UUIDModel, SoftDeleteModel):
         post_ban.send(sender=self.__class__, instance=self)
 
 
+class ConnectionManager(models.Manager):
+    def mark_used(self, ids: Iterable[int]) -> int:
+        return self.filter(id__in=ids).update(date_last_used=now())
+
+
 class Connection(TimestampModel):
     class Meta:
         ordering = [
@@ -147,6 +155,7 @@ class Connection(TimestampModel):
             "id",
         ]
 
+    objects = ConnectionManager()
     default_message_class = user_pb2.Connection
 
     class Hardware(models.TextChoices):
@@ -177,8 +186,10 @@ class Connection(TimestampModel):
     def __str__(self) -> str:
         return f"{self.user}: {self.hardware}/{self.software} ({self.date_created})"
 
-    def get_message_field_values(self, **options) -> dict:
-        data = super().get_message_field_values(**options)
+    def get_message_field_values(
+        self, message_class: Type[Message], **overrides
+    ) -> dict:
+        data = super().get_message_field_values(message_class, **overrides)
         data["client"] = user_pb2.Client(hardware=self.hardware, software=self.software)
         return data
 
@@ -16,8 +16,10 @@ from google.protobuf import empty_pb2
 from grpc_interceptor.exceptions import AlreadyExists, InvalidArgument, PermissionDenied
 
 from core import jwt
-from core.authentication import no_auth
+from core.authentication import no_auth, query_budget
 from core.grpc import get_info_from_token, get_token, serialize_message
+from core.hashing import password_hasher
+from core.ratelimit import rate_limit
 from core.services import ImageUploadMixin
 from notifications.models import delete_notifications_for
 from notifications.tasks import report_content
@@ -43,7 +45,9 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
         reserved = open(path.join(__package__, "reserved-usernames.txt"), "r")
         self.reverved_usernames = [normalize(name) for name in reserved]
 
+    @query_budget(per_call=15)
     @no_auth
+    @rate_limit(("peer", 5, 3600), ("email", 3, 3600))
     def Create(
         self, request: user_pb2.UserCreation, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -57,22 +61,30 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
         elif normalize(request.username) in self.reverved_usernames:
             raise PermissionDenied("username_reserved")
 
+        data["password"] = None
+        password = password_hasher.make_password(request.password)
+
         with atomic():
             user = get_user_model().objects.create_user(**data, is_active=False)
+            user.password = password
             user.clean_fields()
+            user.save(update_fields=["password"])
 
         user_id = str(user.id)
         send_account_activation_email.delay(user_id=user_id)
         fetch_default_user_avatar.delay(user_id=user_id)
         return empty_pb2.Empty()
 
+    @query_budget(per_call=30)
     def Delete(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
         context.caller.delete()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=5)
     @no_auth
+    @rate_limit(("peer", 10, 3600), ("email", 3, 3600))
     def SendActivationEmail(
         self, request: user_pb2.Email, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -82,6 +94,7 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
 
         return empty_pb2.Empty()
 
+    @query_budget(per_call=10)
     @no_auth
     @atomic
     def ConfirmActivation(
@@ -101,7 +114,9 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
         )
         return user_pb2.Token(token=connection.get_token())
 
+    @query_budget(per_call=5)
     @no_auth
+    @rate_limit(("peer", 10, 3600), ("email", 3, 3600))
     def SendRecoveryEmail(
         self, request: user_pb2.Email, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -113,6 +128,7 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
 
         return empty_pb2.Empty()
 
+    @query_budget(per_call=10)
     @no_auth
     def ConfirmRecovery(
         self, request: user_pb2.ConnectionToken, context: grpc.ServicerContext
@@ -129,13 +145,16 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
         )
         return user_pb2.Token(token=connection.get_token())
 
+    @query_budget(per_call=3)
     def ListConnections(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> user_pb2.Connections:
         connections = Connection.objects.filter(user=context.caller)
         return user_pb2.Connections(connections=[c.to_message() for c in connections])
 
+    @query_budget(per_call=10)
     @no_auth
+    @rate_limit(("peer", 30, 300), ("identifier", 10, 300))
     def Connect(
         self, request: user_pb2.Credentials, context: grpc.ServicerContext
     ) -> user_pb2.Token:
@@ -145,7 +164,7 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
             user := get_user_model().objects.filter(user_query).first()
         ):
             raise InvalidArgument("invalid_credentials")
-        elif not user.check_password(request.password):
+        elif not password_hasher.check_password(user, request.password):
             raise InvalidArgument("invalid_credentials")
         elif not user.is_alive_and_kicking:
             if user.is_pending:
@@ -167,6 +186,7 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
 
         return user_pb2.Token(token=connection.get_token())
 
+    @query_budget(per_call=10)
     def Disconnect(
         self, request: id_pb2.IntId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -179,6 +199,7 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
         connection.delete()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=5)
     def DisconnectAll(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -187,16 +208,19 @@ class AccountService(user_pb2_grpc.AccountServiceServicer):
 
 
 class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
+    @query_budget(per_call=3)
     def Retrieve(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> user_pb2.User:
         return get_user_model().existing_objects.get(id=request.id).to_message(email="")
 
+    @query_budget(per_call=2)
     def RetrieveMe(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> user_pb2.User:
         return context.caller.to_message()
 
+    @query_budget(per_call=5)
     def UpdateBio(
         self, request: user_pb2.Bio, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -205,6 +229,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
         context.caller.save()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=15)
     def UpdateAvatar(
         self,
         request_iterator: Iterator[image_pb2.ImageChunk],
@@ -214,14 +239,18 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
         self.set_image(context.caller, "avatar", image)
         return empty_pb2.Empty()
 
+    @query_budget(per_call=5)
+    @rate_limit(("caller", 5, 3600))
     def UpdatePassword(
         self, request: user_pb2.Password, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
         validate_password(request.password)
-        context.caller.set_password(request.password)
+        context.caller.password = password_hasher.make_password(request.password)
         context.caller.save()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=3)
+    @rate_limit(("caller", 3, 3600))
     def SendEmailUpdateEmail(
         self, request: user_pb2.Email, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -231,6 +260,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
         )
         return empty_pb2.Empty()
 
+    @query_budget(per_call=10)
     def ConfirmEmailUpdate(
         self, request: user_pb2.Token, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -245,6 +275,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
         user.save()
         return empty_pb2.Empty()
 
+    @query_budget(per_call=3)
     def ListBlocked(
         self, request: empty_pb2.Empty, context: grpc.ServicerContext
     ) -> user_pb2.Profiles:
@@ -253,6 +284,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
             profiles=[u.to_message(message_class=user_pb2.Profile) for u in users]
         )
 
+    @query_budget(per_call=8)
     def UpdateBlock(
         self, request: user_pb2.Block, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -265,6 +297,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
 
         return empty_pb2.Empty()
 
+    @query_budget(per_call=5)
     def Report(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -280,6 +313,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
         )
         return empty_pb2.Empty()
 
+    @query_budget(per_call=30)
     def Absolve(
         self, request: id_pb2.StringId, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -294,6 +328,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
         delete_notifications_for(user)
         return empty_pb2.Empty()
 
+    @query_budget(per_call=30)
     def Ban(
         self, request: user_pb2.BanSentence, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -310,6 +345,7 @@ class UserService(ImageUploadMixin, user_pb2_grpc.UserServiceServicer):
         user.ban(timedelta(days=request.days) if request.days else None)
         return empty_pb2.Empty()
 
+    @query_budget(per_call=5)
     def Promote(
         self, request: user_pb2.Promotion, context: grpc.ServicerContext
     ) -> empty_pb2.Empty:
@@ -3,8 +3,10 @@ from django.contrib.auth.models import AbstractUser
 from django.db.models.signals import ModelSignal, post_delete, post_save
 from django.dispatch import receiver
 
+from core.grpc import principal_cache
 from core.signals import post_soft_delete
 
+from .models import Connection
 from .tasks import remove_user_data
 
 pre_ban = ModelSignal(use_caching=True)
@@ -13,6 +15,8 @@ post_ban = ModelSignal(use_caching=True)
 
 @receiver(post_save, sender=get_user_model())
 def on_user_post_save(instance: AbstractUser, created: bool, **kwargs):
+    principal_cache.invalidate_user(instance.id)
+
     if instance.is_deleted and instance.is_active:
         instance.is_active = False
         instance.save()
@@ -20,14 +24,22 @@ def on_user_post_save(instance: AbstractUser, created: bool, **kwargs):
 
 @receiver(post_ban, sender=get_user_model())
 def on_user_post_ban(instance: AbstractUser, **kwargs):
+    principal_cache.invalidate_user(instance.id)
     remove_user_data.delay(user_id=str(instance.id))
 
 
 @receiver(post_delete, sender=get_user_model())
 def on_user_post_delete(instance: AbstractUser, **kwargs):
+    principal_cache.invalidate_user(instance.id)
     instance.avatar.delete(save=False)
 
 
 @receiver(post_soft_delete, sender=get_user_model())
 def on_user_post_soft_delete(instance: AbstractUser, **kwargs):
+    principal_cache.invalidate_user(instance.id)
     remove_user_data.delay(user_id=str(instance.id))
+
+
+@receiver(post_delete, sender=Connection)
+def on_connection_post_delete(instance: Connection, **kwargs):
+    principal_cache.invalidate_connection(instance.user_id, instance.id)
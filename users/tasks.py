@@ -75,8 +75,3 @@ def send_account_recovery_email(user_id: str):
 @shared_task
 def send_user_email_update_email(user_id: str, email: str):
     UserEmailUpdateEmail(user_id, email).send()
-
-
-@shared_task
-def use_connection(connection_id: int):
-    Connection.objects.get(id=connection_id).save()
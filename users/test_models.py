@@ -31,3 +31,20 @@ class User_block(BaseUserTestCase):
 
         with self.assertRaises(IntegrityError):
             Block.objects.create(issuer=self.main_user, target=self.other_user)
+
+
+class Connection_mark_used(BaseUserTestCase):
+    def test(self):
+        connections = [Connection.objects.create(user=self.main_user) for _ in range(3)]
+        last_used = now() - timedelta(days=1)
+        Connection.objects.update(date_last_used=last_used)
+        before = now()
+        updated = Connection.objects.mark_used([c.id for c in connections[:2]])
+        self.assertEqual(updated, 2)
+
+        for connection in connections[:2]:
+            connection.refresh_from_db()
+            self.assertGreaterEqual(connection.date_last_used, before)
+
+        connections[2].refresh_from_db()
+        self.assertEqual(connections[2].date_last_used, last_used)
@@ -16,6 +16,7 @@ from grpc_interceptor.exceptions import (
 )
 
 from core import jwt
+from core.grpc import get_info_from_token, get_token, principal_cache
 from core.tests import ImageTestCaseMixin, get_asset
 from notifications.models import CountUnit, Notification
 from notifications.tests import BaseNotificationTestCase
@@ -405,6 +406,17 @@ class AccountService_Disconnect(AccountServiceTestCase, AuthenticatedTestCase):
         self.assertEqual(Connection.objects.count(), connection_count - 1)
         self.assertNotIn(self.main_connection.id, Connection.objects.values("id"))
 
+    def test_cached(self):
+        token = get_token(self.grpc_context)
+        get_info_from_token(token)
+        hits = principal_cache.hits
+        get_info_from_token(token)
+        self.assertEqual(principal_cache.hits, hits + 1)
+        self.service.Disconnect(self.request, self.grpc_context)
+
+        with self.assertRaises(Unauthenticated):
+            get_info_from_token(token)
+
     def test_specific(self):
         connection = Connection.objects.create(user=self.main_user)
         connection_count = Connection.objects.count()
@@ -523,7 +535,7 @@ class UserService_UpdateAvatar(ImageTestCaseMixin, UserServiceTestCase):
         for extension in ("jpeg", "png"):
             self.service.UpdateAvatar(self.make_request(extension), self.grpc_context)
             self.main_user.refresh_from_db()
-            self.assertRegex(str(self.main_user.avatar), r".*\." + extension)
+            self.assertRegex(str(self.main_user.avatar), r".*\.\d+\.webp$")
 
     def test_empty(self):
         self.service.UpdateAvatar(self.make_request("jpeg"), self.grpc_context)
@@ -725,6 +737,15 @@ class UserService_Ban(UserServiceTestCase):
             delta=timedelta(seconds=1),
         )
 
+    def test_cached(self):
+        connection = Connection.objects.create(user=self.other_user)
+        token = connection.get_token()
+        self.assertFalse(get_info_from_token(token)[0].is_banned)
+        self.service.Ban(self.request, self.grpc_context)
+
+        with self.assertRaises(Unauthenticated):
+            get_info_from_token(token)
+
     def test_no_duration(self):
         self.request.ClearField("days")
         self.service.Ban(self.request, self.grpc_context)